@@ -0,0 +1,76 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.exceptions import ValidationError
+
+
+class SparseFieldsMixin:
+    """
+    Lets list views return only some of their serializer's fields, e.g. ?fields=id,name,document_type.
+    The queryset then only loads the columns those fields read, so large columns that are not asked for
+    are never read from the database.
+
+    Fields the mixin cannot map to columns itself, such as SerializerMethodFields, can list the model fields
+    they read in the serializer's Meta.field_sources. Requesting a field it cannot map loads every column
+    """
+
+    def get_sparse_fields(self):
+        # Field names from ?fields=, or None for every field
+        param = self.request.query_params.get("fields", None)
+        if not param:
+            return None
+
+        requested = {name.strip() for name in param.split(",") if name.strip()}
+        unknown = requested - set(self.get_serializer_class()().fields)
+        if unknown:
+            raise ValidationError(
+                {"error": f"Unknown fields: {', '.join(sorted(unknown))}"})
+        return requested
+
+    def wants_field(self, name):
+        # Whether the response includes a field, so views can skip work done only for that field
+        requested = self.get_sparse_fields()
+        return requested is None or name in requested
+
+    def get_sparse_columns(self, requested):
+        # Model fields read by the requested serializer fields, or None if that is not known
+        serializer = self.get_serializer_class()()
+        model = serializer.Meta.model
+        field_sources = getattr(serializer.Meta, "field_sources", {})
+
+        columns = {model._meta.pk.name}
+        for name in requested:
+            if name in field_sources:
+                columns.update(field_sources[name])
+                continue
+
+            source = serializer.fields[name].source
+            if source == "*":
+                return None
+            try:
+                model_field = model._meta.get_field(source.split(".")[0])
+            except FieldDoesNotExist:
+                # A property or method, which may read any column
+                return None
+            # Many to many and reverse relations are loaded with their own queries
+            if model_field.concrete:
+                columns.add(model_field.name)
+        return columns
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        requested = self.get_sparse_fields()
+        if requested:
+            columns = self.get_sparse_columns(requested)
+            if columns:
+                queryset = queryset.only(*columns)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        requested = self.get_sparse_fields()
+        if requested:
+            # List serializers hold the fields on their child
+            fields = getattr(serializer, "child", serializer).fields
+            for name in list(fields):
+                if name not in requested:
+                    fields.pop(name)
+        return serializer
@@ -2,6 +2,7 @@ from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from accounts.permissions import IsHead, IsStaff
+from api.mixins import SparseFieldsMixin
 from django.utils.dateparse import parse_datetime
 from rest_framework.pagination import PageNumberPagination
 from .serializers import (
@@ -36,7 +37,7 @@ class AuthorizationRequestCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
 
 
-class AuthorizationRequestListView(generics.ListAPIView):
+class AuthorizationRequestListView(SparseFieldsMixin, generics.ListAPIView):
     """
     Returns authorization requests. If authorization requests are approved, also returns the link to download the document.
     Staff/Head are able to view all authorization requests here. Clients are only able to view their own requests.
@@ -79,7 +80,7 @@ class AuthorizationRequestListView(generics.ListAPIView):
 
         return queryset
 
-class WidgetAuthorizationRequestListView(generics.ListAPIView):
+class WidgetAuthorizationRequestListView(SparseFieldsMixin, generics.ListAPIView):
     """
     Returns authorization requests. If authorization requests are approved, also returns the link to download the document.
     Staff/Head are able to view all authorization requests here. Clients are only able to view their own requests.
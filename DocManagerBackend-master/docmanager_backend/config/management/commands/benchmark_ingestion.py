@@ -0,0 +1,169 @@
+from django.core.management.base import BaseCommand
+from django.core.cache import cache
+from django.db import connection, close_old_connections
+from django.test.utils import override_settings
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+from documents.benchmark import FakeOllamaServer, generate_pdfs, percentile
+from documents.extraction import get_client, get_extraction_cache
+from documents.ocr import get_ocr_cache
+from config.management.commands.start_watcher import PDFHandler
+from config.settings import WATCHER_WORKERS, WATCHER_OCR_PROCESSES
+import json
+import logging
+import os
+import tempfile
+import time
+
+# "extract" is the rules, classifier and image preparation, "llm" only the time spent waiting on Ollama
+STAGES = ("hash", "render", "ocr", "extract", "llm", "db", "store")
+
+
+class Command(BaseCommand):
+    help = "Measures watcher throughput on synthetic PDFs against a local stand-in for Ollama"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--files", type=int, default=50,
+                            help="Number of PDFs to process")
+        parser.add_argument("--image-ratio", type=float, default=0.5,
+                            help="Share of PDFs without a text layer, which go through OCR")
+        parser.add_argument("--pages", type=int, default=1,
+                            help="Pages per PDF")
+        parser.add_argument("--headers", action="store_true",
+                            help="Give every PDF a memo header so the rule-based extractor can skip Ollama")
+        parser.add_argument("--latency", type=float, default=0.5,
+                            help="Seconds the fake Ollama server waits before each response")
+        parser.add_argument("--workers", type=int, default=WATCHER_WORKERS,
+                            help="Number of ingestion worker threads")
+        parser.add_argument("--ocr-processes", type=int, default=WATCHER_OCR_PROCESSES,
+                            help="Number of OCR processes")
+        parser.add_argument("--seed", type=int, default=None,
+                            help="Seed for the generated text")
+        parser.add_argument("--output", default=None,
+                            help="Also write the results as JSON to this file")
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory(prefix="benchmark_") as work_dir:
+            inbox = os.path.join(work_dir, "uploads")
+            os.makedirs(inbox)
+
+            self.stdout.write(f"Generating {options['files']} PDF(s)...")
+            file_paths = generate_pdfs(inbox, options["files"], image_ratio=options["image_ratio"],
+                                       pages=options["pages"], headers=options["headers"], seed=options["seed"])
+
+            # Documents are written to a throwaway database and media folder so the real ones are left untouched
+            old_name = connection.settings_dict["NAME"]
+            connection.settings_dict["TEST"]["NAME"] = os.path.join(
+                work_dir, "benchmark.sqlite3")
+            connection.creation.create_test_db(
+                verbosity=0, autoclobber=True, serialize=False)
+            cache.clear()
+
+            # OCR and extraction results are cached in the work folder as well, so the real caches are neither read,
+            # which would skip the work being measured, nor filled with synthetic documents.
+            # The OCR processes read the paths from the environment when they start
+            cache_paths = {
+                "OCR_CACHE_PATH": os.path.join(work_dir, "ocr.sqlite3"),
+                "EXTRACTION_CACHE_PATH": os.path.join(work_dir, "extraction.sqlite3"),
+            }
+
+            try:
+                with FakeOllamaServer(latency=options["latency"]) as server, override_settings(MEDIA_ROOT=os.path.join(work_dir, "media")), \
+                        mock.patch.dict(os.environ, cache_paths), \
+                        mock.patch("documents.ocr.OCR_CACHE_PATH", cache_paths["OCR_CACHE_PATH"]), \
+                        mock.patch("documents.extraction.EXTRACTION_CACHE_PATH", cache_paths["EXTRACTION_CACHE_PATH"]):
+                    os.environ["OLLAMA_URL"] = server.url
+                    os.environ["OLLAMA_USE_AUTH"] = "False"
+                    os.environ.setdefault("OLLAMA_MODEL", "benchmark")
+                    get_client.cache_clear()
+                    get_ocr_cache.cache_clear()
+                    get_extraction_cache.cache_clear()
+
+                    # Keep the per-file watcher logs out of the report, as ingest_directory does
+                    if options["verbosity"] < 2:
+                        for logger in ("config.management.commands.start_watcher", "documents.metrics", "httpx"):
+                            logging.getLogger(logger).setLevel(logging.WARNING)
+                    handler = PDFHandler(
+                        workers=options["workers"], ocr_processes=options["ocr_processes"])
+                    results = self.run_benchmark(
+                        handler, file_paths, options["workers"])
+                    handler.ocr_executor.shutdown(wait=True)
+            finally:
+                close_old_connections()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                cache.clear()
+                get_ocr_cache.cache_clear()
+                get_extraction_cache.cache_clear()
+
+        results.update({
+            "latency": options["latency"],
+            "image_ratio": options["image_ratio"],
+            "pages": options["pages"],
+            "headers": options["headers"],
+        })
+        self.report(results)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+
+    def run_benchmark(self, handler, file_paths, workers):
+        timings = []
+        errors = []
+
+        def process(file_path):
+            file_timings = {}
+            start_time = time.perf_counter()
+            try:
+                handler.process_pdf(file_path, timings=file_timings)
+                file_timings["total"] = time.perf_counter() - start_time
+                timings.append(file_timings)
+            except Exception as e:
+                errors.append(f"{os.path.basename(file_path)}: {e}")
+            finally:
+                close_old_connections()
+
+        self.stdout.write(
+            f"Processing {len(file_paths)} PDF(s) with {workers} worker(s)...")
+        start_time = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(process, file_paths))
+        elapsed = time.perf_counter() - start_time
+
+        stages = {}
+        for stage in (*STAGES, "total"):
+            values = [
+                file_timings[stage] for file_timings in timings if stage in file_timings]
+            if values:
+                stages[stage] = {
+                    "count": len(values),
+                    "p50": percentile(values, 50),
+                    "p95": percentile(values, 95),
+                }
+        return {
+            "files": len(file_paths),
+            "processed": len(timings),
+            "failed": len(errors),
+            "errors": errors[:10],
+            "workers": workers,
+            "elapsed": elapsed,
+            "documents_per_minute": len(timings) / elapsed * 60 if elapsed else 0,
+            "stages": stages,
+        }
+
+    def report(self, results):
+        self.stdout.write("")
+        self.stdout.write(
+            f"{'stage':<10}{'count':>8}{'p50 (ms)':>12}{'p95 (ms)':>12}")
+        for stage, values in results["stages"].items():
+            self.stdout.write(
+                f"{stage:<10}{values['count']:>8}{values['p50'] * 1000:>12.1f}{values['p95'] * 1000:>12.1f}")
+        self.stdout.write("")
+        self.stdout.write(
+            f"Processed {results['processed']} of {results['files']} file(s) in {results['elapsed']:.2f}s "
+            f"({results['documents_per_minute']:.1f} documents per minute)")
+
+        if results["failed"]:
+            self.stdout.write(self.style.WARNING(
+                f"{results['failed']} file(s) failed:"))
+            for error in results["errors"]:
+                self.stdout.write(f"  {error}")
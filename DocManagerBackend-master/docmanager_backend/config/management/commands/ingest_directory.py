@@ -0,0 +1,217 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from collections import Counter
+from documents.models import Document, DocumentType, ExtractionRun
+from documents.hashing import file_sha256
+from documents.storage import store_file
+from documents.search import index_documents
+from documents.metrics import log_event
+from notifications.models import Notification
+from config.management.commands.start_watcher import PDFHandler
+from config.settings import CACHE_DIR, WATCHER_WORKERS, WATCHER_OCR_PROCESSES
+import hashlib
+import json
+import logging
+import os
+import time
+
+# Number of hashes looked up per query when filtering out files that are already stored
+HASH_LOOKUP_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = "Imports every PDF in a directory tree, for one-off migrations of existing archives"
+
+    def add_arguments(self, parser):
+        parser.add_argument("directory", help="Folder to import PDFs from")
+        parser.add_argument("--workers", type=int, default=WATCHER_WORKERS,
+                            help="Number of files read at the same time")
+        parser.add_argument("--ocr-processes", type=int, default=WATCHER_OCR_PROCESSES,
+                            help="Number of OCR processes")
+        parser.add_argument("--batch-size", type=int, default=200,
+                            help="Number of documents written to the database at a time")
+        parser.add_argument("--checkpoint", default=None,
+                            help="File that records progress so an interrupted import can resume. Defaults to one per directory in the cache folder")
+        parser.add_argument("--move", action="store_true",
+                            help="Remove imported files from the directory. By default they are left in place")
+
+    def handle(self, *args, **options):
+        directory = os.path.abspath(options["directory"])
+        if not os.path.isdir(directory):
+            raise CommandError(f"'{directory}' is not a directory")
+
+        self.verbosity = options["verbosity"]
+        self.move = options["move"]
+        self.batch_size = options["batch_size"]
+        self.checkpoint_path = options["checkpoint"] or os.path.join(
+            CACHE_DIR, "imports", f"{hashlib.sha256(directory.encode()).hexdigest()[:16]}.jsonl")
+        self.counts = Counter()
+        start_time = time.perf_counter()
+
+        # Files already stored or skipped by an earlier run of this import are not looked at again. Failed files are retried
+        done = self.load_checkpoint()
+        file_paths = []
+        for root, _, filenames in os.walk(directory):
+            for filename in sorted(filenames):
+                file_path = os.path.join(root, filename)
+                if file_path.lower().endswith(".pdf") and file_path not in done:
+                    file_paths.append(file_path)
+        self.stdout.write(
+            f"Found {len(file_paths)} PDF file(s) to import ({len(done)} already done)")
+
+        # Keep the per-file watcher logs out of the import output
+        if self.verbosity < 2:
+            for logger in ("config.management.commands.start_watcher", "documents.metrics", "httpx"):
+                logging.getLogger(logger).setLevel(logging.WARNING)
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            todo = self.filter_known(file_paths, executor)
+
+            handler = PDFHandler(
+                workers=options["workers"], ocr_processes=options["ocr_processes"])
+            handler.classifier.refresh()
+            try:
+                self.import_files(handler, executor, todo, options["workers"])
+            finally:
+                handler.ocr_executor.shutdown(wait=True)
+                close_old_connections()
+
+        elapsed = time.perf_counter() - start_time
+        summary = f"Imported {self.counts['stored']} document(s) from {directory}. {self.counts['duplicate']} duplicate(s) skipped, {self.counts['failed']} failed."
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary} Took {elapsed:.0f}s"))
+        log_event("import_finished", directory=directory,
+                  seconds=round(elapsed, 1), **self.counts)
+
+        # One notification for the whole import instead of one per file
+        if self.counts["stored"] or self.counts["failed"]:
+            Notification.objects.create(
+                type="warning" if self.counts["failed"] else "info",
+                audience="staff",
+                content=summary)
+
+    def load_checkpoint(self):
+        done = set()
+        if os.path.exists(self.checkpoint_path):
+            with open(self.checkpoint_path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    if entry["status"] == "failed":
+                        done.discard(entry["path"])
+                    else:
+                        done.add(entry["path"])
+        os.makedirs(os.path.dirname(self.checkpoint_path), exist_ok=True)
+        return done
+
+    def checkpoint(self, entries):
+        # Appends and flushes right away so progress survives the import being stopped
+        with open(self.checkpoint_path, "a") as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        for entry in entries:
+            self.counts[entry["status"]] += 1
+
+    def filter_known(self, file_paths, executor):
+        # Hashes every file, then drops those already stored, or repeated within the import, before any OCR or LLM work
+        self.stdout.write(f"Hashing {len(file_paths)} file(s)...")
+        hashes = dict(zip(file_paths, executor.map(file_sha256, file_paths)))
+
+        known = set()
+        unique_hashes = list(set(hashes.values()))
+        for i in range(0, len(unique_hashes), HASH_LOOKUP_SIZE):
+            known.update(Document.objects.filter(content_hash__in=unique_hashes[i:i + HASH_LOOKUP_SIZE]).values_list(
+                "content_hash", flat=True))
+
+        todo = []
+        duplicates = []
+        for file_path, content_hash in hashes.items():
+            if content_hash in known:
+                duplicates.append(
+                    {"path": file_path, "status": "duplicate", "hash": content_hash})
+            else:
+                known.add(content_hash)
+                todo.append((file_path, content_hash))
+        if duplicates:
+            self.checkpoint(duplicates)
+        self.stdout.write(
+            f"Skipping {len(duplicates)} file(s) that are already stored")
+        return todo
+
+    def import_files(self, handler, executor, todo, workers):
+        def read(file_path, content_hash):
+            try:
+                DOCUMENT, extraction = handler.read_pdf(
+                    file_path, content_hash, {}, notify=False)
+                return file_path, DOCUMENT, extraction, None
+            except Exception as e:
+                return file_path, None, None, e
+            finally:
+                close_old_connections()
+
+        batch = []
+        failures = []
+
+        def collect(futures):
+            for future in futures:
+                file_path, DOCUMENT, extraction, error = future.result()
+                if error:
+                    self.stderr.write(f"Failed to read '{file_path}': {error}")
+                    failures.append(
+                        {"path": file_path, "status": "failed", "error": str(error)})
+                else:
+                    batch.append((file_path, DOCUMENT, extraction))
+
+            if len(batch) >= self.batch_size:
+                self.write_batch(handler, batch)
+                batch.clear()
+            if failures:
+                self.checkpoint(failures)
+                failures.clear()
+
+        # Only a few files are read ahead of the workers so a large import does not hold every result in memory
+        pending = set()
+        for file_path, content_hash in todo:
+            if len(pending) >= workers * 2:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            pending.add(executor.submit(read, file_path, content_hash))
+        collect(wait(pending).done)
+
+        if batch:
+            self.write_batch(handler, batch)
+
+    def write_batch(self, handler, batch):
+        # Files are linked into storage first so the rows can be inserted with their file names in one query.
+        # The sources are only removed once the rows are committed
+        stored = []
+        try:
+            for file_path, DOCUMENT, _ in batch:
+                stored.append(store_file(DOCUMENT.file, file_path, os.path.basename(
+                    file_path), keep_source=True, save=False))
+
+            # bulk_create skips signals, so the document type registry and search index are updated here instead
+            with transaction.atomic():
+                documents = Document.objects.bulk_create(
+                    [DOCUMENT for _, DOCUMENT, _ in batch])
+                ExtractionRun.objects.bulk_create([
+                    run for _, DOCUMENT, extraction in batch for run in handler.extraction_runs(DOCUMENT, extraction)])
+                for document_type, count in Counter(DOCUMENT.document_type for DOCUMENT in documents).items():
+                    DocumentType.adjust(document_type, count)
+                index_documents(documents)
+        except Exception:
+            for name in stored:
+                default_storage.delete(name)
+            raise
+
+        if self.move:
+            for file_path, _, _ in batch:
+                os.remove(file_path)
+
+        self.checkpoint([
+            {"path": file_path, "status": "stored", "document_id": DOCUMENT.id} for file_path, DOCUMENT, _ in batch])
+        self.stdout.write(
+            f"Stored {len(batch)} document(s) ({self.counts['stored']} so far)")
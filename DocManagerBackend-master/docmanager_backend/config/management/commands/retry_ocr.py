@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from concurrent.futures import wait
+from documents.models import Document
+from documents.tasks import executor, ocr_executor, reset_document_ocr, run_document_ocr
+import time
+
+
+class Command(BaseCommand):
+    help = "Reads the text of documents whose OCR failed again, or of the given documents"
+
+    def add_arguments(self, parser):
+        parser.add_argument("document_ids", nargs="*", type=int,
+                            help="Documents to read again. Defaults to every document whose OCR failed")
+
+    def handle(self, *args, **options):
+        start_time = time.perf_counter()
+        document_ids = reset_document_ocr(options["document_ids"] or None)
+        self.stdout.write(f"Reading {len(document_ids)} document(s) again...")
+
+        try:
+            wait([executor.submit(run_document_ocr, document_id)
+                 for document_id in document_ids])
+        finally:
+            ocr_executor.shutdown(wait=True)
+
+        failed = Document.objects.filter(
+            id__in=document_ids, ocr_status="failed").count()
+        self.stdout.write(self.style.SUCCESS(
+            f"Read {len(document_ids) - failed} document(s), {failed} failed. Took {time.perf_counter() - start_time:.0f}s"))
@@ -1,285 +1,607 @@
-import base64
-import httpx
 from django.core.management.base import BaseCommand
-
-from io import BytesIO
-from documents.models import Document
-from PIL import Image
-import pytesseract
-import fitz
+from django.db import close_old_connections, transaction, IntegrityError
+
+from django.utils.timezone import now
+from documents.models import Document, DocumentType, IngestionJob, ExtractionRun
+from documents.ocr import render_first_page, ocr_image, is_text_usable
+from documents.hashing import file_sha256
+from documents.storage import store_file
+from documents.metrics import metrics, log_event
+from documents.tasks import requeue_document_ocr
+from documents.extraction import (
+    extract_fields,
+    extract_fields_from_text,
+    is_text_suitable,
+    compare_fields,
+    OllamaUnavailable,
+    OLLAMA_ERRORS,
+    FIELD_NAMES
+)
+from documents.rules import extract_rule_fields
+from documents.classifier import CategoryClassifier
+from documents.images import prepare_llm_image, llm_image_variant
 import os
-from config.settings import MEDIA_ROOT
+import queue
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from config.settings import (
+    MEDIA_ROOT,
+    WATCHER_WORKERS,
+    WATCHER_OCR_PROCESSES,
+    WATCHER_QUEUE_SIZE,
+    WATCHER_MAX_ATTEMPTS,
+    WATCHER_RETRY_BACKOFF,
+    WATCHER_POLL_INTERVAL,
+    WATCHER_STABLE_SECONDS,
+    METRICS_INTERVAL,
+    OCR_REQUEUE_INTERVAL,
+    RULES_CONFIDENCE_THRESHOLD,
+    EXTRACTION_MODE,
+    OLLAMA_TEXT_MODEL,
+    get_secret
+)
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
-from documents.models import Document
-from config.settings import get_secret
-from django.core.files import File
 import logging
 import time
-from ollama import Client
-from pydantic import BaseModel
-from datetime import date
-from typing import Optional
 from notifications.models import Notification
 
 
+def record_stage(timings, stage, start):
+    # Adds the time since start to timings[stage] and returns the current time so stages can be chained
+    end = time.perf_counter()
+    timings[stage] = timings.get(stage, 0) + end - start
+    return end
+
+
 class PDFHandler(FileSystemEventHandler):
-    def __init__(self):
+    def __init__(self, workers=WATCHER_WORKERS, ocr_processes=WATCHER_OCR_PROCESSES, queue_size=WATCHER_QUEUE_SIZE):
         logging.basicConfig(
             level=logging.INFO,
-            format="%(asctime)s - %(message)s",
+            format="%(asctime)s - %(threadName)s - %(message)s",
             datefmt="%Y-%m-%d %H:%M:%S",
         )
 
         self.logger = logging.getLogger(__name__)
         self.logger.info("Starting Document Watcher...")
 
-    def on_created(self, event):
-        if event.is_directory:
-            return None
+        # IDs of ingestion jobs waiting for a worker. The dispatcher stops pulling jobs from the database once full
+        self.queue = queue.Queue(maxsize=queue_size)
+        # IDs of jobs that are in the queue or being processed, so they are not dispatched twice
+        self.in_flight = set()
+        self.in_flight_lock = threading.Lock()
+
+        # Set when a new job is created so the dispatcher does not wait for the next poll
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+        self.dispatcher = threading.Thread(
+            target=self.dispatch_jobs, name="Ingestion-Dispatcher", daemon=True)
+
+        # Files seen by the watcher that may still be being written, by path: (size, mtime, time of last change).
+        # Repeated events for the same path only update its entry, so each file is enqueued once
+        self.pending_files = {}
+        self.pending_files_lock = threading.Lock()
+        self.settler = threading.Thread(
+            target=self.settle, name="Ingestion-Settler", daemon=True)
+
+        # Rendering and Tesseract are CPU bound so they run in separate processes.
+        # Spawn is used since forking a process that already runs threads is unsafe
+        self.ocr_executor = ProcessPoolExecutor(
+            max_workers=ocr_processes, mp_context=multiprocessing.get_context("spawn"))
+
+        # Ollama calls and database writes are I/O bound so they run in threads
+        self.workers = [
+            threading.Thread(target=self.worker, name=f"Ingestion-Worker-{i + 1}", daemon=True) for i in range(workers)
+        ]
+
+        # Shared by every worker. Trained on the existing documents when the watcher starts
+        self.classifier = CategoryClassifier()
+
+        self.logger.info(
+            f"Using {workers} ingestion workers, {ocr_processes} OCR processes and a queue size of {queue_size}")
+
+    def start(self):
+        # Jobs left midway by a previous run are picked up again
+        interrupted = IngestionJob.requeue_interrupted()
+        if interrupted:
+            self.logger.info(
+                f"Resuming {interrupted} interrupted ingestion job(s)")
+        # Background OCR queued by server processes is lost when they stop, so every pending document is queued again
+        # here. dispatch_jobs keeps queuing documents that have been pending or processing for too long
+        requeued = requeue_document_ocr(pending_seconds=0)
+        if requeued:
+            self.logger.info(
+                f"Queued OCR for {len(requeued)} unread document(s)")
+
+        start_time = time.perf_counter()
+        self.classifier.refresh()
+        self.logger.info(
+            f"Trained the category classifier on {self.classifier.documents} document(s) in {time.perf_counter() - start_time:.2f}s")
+
+        for worker in self.workers:
+            worker.start()
+        self.dispatcher.start()
+        self.settler.start()
+
+    def scan(self, directory):
+        # Picks up files that arrived while the watcher was not running
+        failed = {
+            file_path: date_updated for file_path, date_updated in IngestionJob.objects.filter(status="failed").values_list("file_path", "date_updated")
+        }
+        found = 0
+        for root, _, filenames in os.walk(directory):
+            for filename in filenames:
+                file_path = os.path.join(root, filename)
+                if not file_path.endswith(".pdf"):
+                    continue
+                # Files that already failed are only retried if they have been replaced since
+                if file_path in failed and os.path.getmtime(file_path) <= failed[file_path].timestamp():
+                    continue
+                self.track(file_path)
+                found += 1
+        self.logger.info(
+            f"Found {found} existing PDF file(s) in '{directory}'")
+
+    def shutdown(self):
+        # Stop pulling new jobs. Anything still queued in the database is resumed on the next start.
+        # Files that were still settling are found again by the startup scan
+        self.stopping.set()
+        self.wakeup.set()
+        self.settler.join()
+        self.dispatcher.join()
+
+        # Jobs already in the queue are processed first since the stop signals are queued behind them
+        self.logger.info(
+            f"Stopping ingestion workers. {self.queue.qsize()} job(s) left in queue")
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+
+        self.ocr_executor.shutdown(wait=True)
+        self.write_metrics()
+        close_old_connections()
+        self.logger.info("Ingestion workers stopped")
+
+    def dispatch_jobs(self):
+        metrics_written = 0
+        ocr_requeued = time.monotonic()
+        while not self.stopping.is_set():
+            try:
+                free_slots = self.queue.maxsize - self.queue.qsize()
+                job_ids = []
+                if free_slots > 0:
+                    with self.in_flight_lock:
+                        in_flight = list(self.in_flight)
+                    job_ids = list(IngestionJob.objects.filter(
+                        status="queued", next_attempt__lte=now()).exclude(id__in=in_flight).order_by(
+                        "next_attempt", "id").values_list("id", flat=True)[:free_slots])
+
+                for job_id in job_ids:
+                    with self.in_flight_lock:
+                        self.in_flight.add(job_id)
+                    self.queue.put(job_id)
+            except Exception as e:
+                self.logger.error(f"Error dispatching ingestion jobs: {str(e)}")
+
+            if time.monotonic() - metrics_written >= METRICS_INTERVAL:
+                self.write_metrics()
+                metrics_written = time.monotonic()
+            if time.monotonic() - ocr_requeued >= OCR_REQUEUE_INTERVAL:
+                try:
+                    requeue_document_ocr()
+                except Exception as e:
+                    self.logger.error(f"Error requeuing OCR: {str(e)}")
+                ocr_requeued = time.monotonic()
+            close_old_connections()
 
-        if event.src_path.endswith(".pdf"):
-            self.logger.info(f"New PDF file detected: {event.src_path}")
-            self.process_pdf(event.src_path)
+            # Wait for a new file or for queued retries to become due
+            self.wakeup.wait(timeout=WATCHER_POLL_INTERVAL)
+            self.wakeup.clear()
 
-    def process_pdf(self, file_path):
+    def write_metrics(self):
         try:
-            # Get the original filename and directory
-            original_filename = os.path.basename(file_path)
-            original_dir = os.path.dirname(file_path)
-
-            # Check if the filename contains spaces
-            if " " in original_filename:
-                # Create the new filename by replacing spaces
-                new_filename = original_filename.replace(" ", "_")
-
-                # Construct the new full file path
-                new_file_path = os.path.join(original_dir, new_filename)
-
-                # Rename the file
-                os.rename(file_path, new_file_path)
+            metrics.set("ingestion_queue_depth", self.queue.qsize())
+            with self.in_flight_lock:
+                metrics.set("ingestion_in_flight", len(self.in_flight))
+            with self.pending_files_lock:
+                metrics.set("ingestion_settling_files",
+                            len(self.pending_files))
+            metrics.set("ingestion_queued_jobs", IngestionJob.objects.filter(
+                status="queued").count())
+            metrics.write("watcher")
+        except Exception as e:
+            self.logger.error(f"Error writing metrics: {str(e)}")
+
+    def record_document(self, filename, outcome, timings, **fields):
+        # Emits the stage timings and outcome of one file as metrics and as a JSON log record
+        metrics.inc("ingestion_documents_total", outcome=outcome)
+        for stage, seconds in timings.items():
+            metrics.observe("ingestion_stage_seconds", seconds, stage=stage)
+        log_event("document_processed", file=filename, outcome=outcome,
+                  stages={stage: round(seconds, 4) for stage, seconds in timings.items()}, **fields)
+
+    def track(self, file_path):
+        # Starts, or restarts, the wait for a file to stop changing
+        try:
+            stat = os.stat(file_path)
+        except OSError:
+            return None
+        with self.pending_files_lock:
+            previous = self.pending_files.get(file_path)
+            if previous and previous[:2] == (stat.st_size, stat.st_mtime):
+                return None
+            self.pending_files[file_path] = (
+                stat.st_size, stat.st_mtime, time.monotonic())
+
+    def untrack(self, file_path):
+        with self.pending_files_lock:
+            self.pending_files.pop(file_path, None)
+
+    def settle(self):
+        # Enqueues files once their size and modification time have not changed for WATCHER_STABLE_SECONDS,
+        # so files still being copied from the scanner are not read half-written
+        while not self.stopping.wait(timeout=min(1, max(WATCHER_STABLE_SECONDS / 2, 0.1))):
+            with self.pending_files_lock:
+                pending_files = list(self.pending_files.items())
+
+            ready = []
+            for file_path, (size, mtime, changed) in pending_files:
+                try:
+                    stat = os.stat(file_path)
+                except OSError:
+                    # Deleted or moved away before it settled
+                    self.untrack(file_path)
+                    continue
+
+                if (stat.st_size, stat.st_mtime) != (size, mtime):
+                    self.track(file_path)
+                elif stat.st_size and time.monotonic() - changed >= WATCHER_STABLE_SECONDS:
+                    ready.append(file_path)
+
+            if not ready:
+                continue
+            try:
+                for file_path in ready:
+                    self.logger.info(f"PDF file is ready: {file_path}")
+                    IngestionJob.enqueue(file_path)
+                    self.untrack(file_path)
+                self.wakeup.set()
+            except Exception as e:
+                self.logger.error(f"Error enqueueing ingestion jobs: {str(e)}")
+            finally:
+                close_old_connections()
+
+    def worker(self):
+        while True:
+            job_id = self.queue.get()
+            try:
+                # None is used as the signal to stop the worker
+                if job_id is None:
+                    break
+                self.process_job(job_id)
+            finally:
+                with self.in_flight_lock:
+                    self.in_flight.discard(job_id)
+                # Each thread holds its own database connection
+                close_old_connections()
+                self.queue.task_done()
+                # A slot has opened up in the queue
+                self.wakeup.set()
+
+    def process_job(self, job_id):
+        job = IngestionJob.claim(job_id)
+        if not job:
+            return None
 
-                # Update the filename and file_path variables
-                filename = new_filename
-                file_path = new_file_path
+        try:
+            self.process_pdf(job.file_path, job=job)
+            metrics.inc("ingestion_jobs_total", outcome="stored")
+        except Exception as e:
+            if job.mark_failed(e, max_attempts=WATCHER_MAX_ATTEMPTS, backoff=WATCHER_RETRY_BACKOFF):
+                metrics.inc("ingestion_jobs_total", outcome="retry")
+                self.logger.warning(
+                    f"Retrying '{job.file_path}' after {job.next_attempt} (attempt {job.attempts} of {WATCHER_MAX_ATTEMPTS})")
             else:
-                filename = original_filename
-            metadata = ""
-            document_type = ""
-
-            with fitz.open(file_path) as doc:
-                num_pages = len(doc)
-
-                # Perform OCR only on the first page
-                page = doc[0]
-                pix = page.get_pixmap(matrix=(1.2, 1.2))
-
-                # Convert pixmap to bytes
-                img_bytes = pix.tobytes()
+                metrics.inc("ingestion_jobs_total", outcome="failed")
+                self.logger.error(
+                    f"Giving up on '{job.file_path}' after {job.attempts} attempt(s)")
+                Notification.objects.create(
+                    type="warning",
+                    audience="staff",
+                    content=f"Failed to process scanned document {os.path.basename(job.file_path)} after {job.attempts} attempt(s).")
 
-                # Create a BytesIO object
-                img_buffer = BytesIO(img_bytes)
+    def on_created(self, event):
+        if event.is_directory:
+            return None
 
-                # Create a PIL Image object from the bytes
-                img = Image.open(img_buffer)
+        if event.src_path.endswith(".pdf"):
+            self.logger.info(f"New PDF file detected: {event.src_path}")
+            self.track(event.src_path)
 
-                # Perform OCR
-                text = pytesseract.image_to_string(img).strip()
+    def on_modified(self, event):
+        if event.is_directory:
+            return None
 
-                # Try to pass image to the Ollama image recognition API first
-                try:
-                    client = Client(
-                        host=get_secret("OLLAMA_URL"),
-                        auth=httpx.BasicAuth(
-                            username=get_secret("OLLAMA_USERNAME"), password=get_secret("OLLAMA_PASSWORD")) if get_secret("OLLAMA_USE_AUTH") else None,
-                    )
-
-                    encoded_image = base64.b64encode(
-                        img_buffer.getvalue()).decode()
-
-                    # Determine category
-                    class DocumentSchema(BaseModel):
-                        category: str = "other"
-                        explanation: Optional[str] = None
-
-                    possible_categories = set((Document.objects.all().values_list(
-                        "document_type", flat=True), "Documented Procedures Manual", "Form", "Special Order", "Memorandum"))
-                    prompt = f"""
-                        Read the text from the image and provide a document_type.
-
-                        Possible document types are: {possible_categories}. You are free to create a new one if none are suitable.
-
-                        Do all of this and return your output in JSON.
-                        """
-
-                    response = client.chat(
-                        model=get_secret("OLLAMA_MODEL"),
-                        messages=[
-                            {"role": "user",
-                                "content": prompt,
-                                "images": [encoded_image]},
-                        ],
-                        format=DocumentSchema.model_json_schema(),
-                        options={
-                            "temperature": 0
-                        },
-                    )
-                    result = DocumentSchema.model_validate_json(
-                        response.message.content)
-                    document_type = result.category
-
-                    # Determine sender
-                    class DocumentSchema(BaseModel):
-                        sent_from: str = "N/A"
-                        explanation: Optional[str] = None
-
-                    prompt = f"""
-                        Determine who sent the document. Otherwise, return N/A.
-
-                        Do all of this and return your output in JSON.
-                        """
-                    response = client.chat(
-                        model=get_secret("OLLAMA_MODEL"),
-                        messages=[
-                            {"role": "user",
-                                "content": prompt,
-                                "images": [encoded_image]},
-                        ],
-                        format=DocumentSchema.model_json_schema(),
-                        options={
-                            "temperature": 0
-                        },
-                    )
-                    result = DocumentSchema.model_validate_json(
-                        response.message.content)
-
-                    sent_from = result.sent_from
-
-                    # Determine subject
-                    class DocumentSchema(BaseModel):
-                        subject: str = "N/A"
-                        explanation: Optional[str] = None
-
-                    prompt = f"""
-                        Identify the subject of the document if it exists.
-
-                        Do all of this and return your output in JSON.
-                        """
-                    response = client.chat(
-                        model=get_secret("OLLAMA_MODEL"),
-                        messages=[
-                            {"role": "user",
-                                "content": prompt,
-                                "images": [encoded_image]},
-                        ],
-                        format=DocumentSchema.model_json_schema(),
-                        options={
-                            "temperature": 0
-                        },
-                    )
-                    result = DocumentSchema.model_validate_json(
-                        response.message.content)
-
-                    document_subject = result.subject
-
-                    # Determine date
-                    class DocumentSchema(BaseModel):
-                        document_date: Optional[date]
-                        explanation: Optional[str] = None
-
-                    prompt = f"""
-                        Identify the date of the document if it exists.
-
-                        If you are unable to determine the date, return nothing.
-
-                        Do all of this and return your output in JSON.
-                        """
-                    response = client.chat(
-                        model=get_secret("OLLAMA_MODEL"),
-                        messages=[
-                            {"role": "user",
-                                "content": prompt,
-                                "images": [encoded_image]},
-                        ],
-                        format=DocumentSchema.model_json_schema(),
-                        options={
-                            "temperature": 0
-                        },
-                    )
-                    result = DocumentSchema.model_validate_json(
-                        response.message.content)
-
-                    document_date = result.document_date
-
-                    if document_date:
-                        document_month = document_date.strftime("%B")
-                        document_year = result.document_date.year
-                        # Set as none for invalid dates
-                        if document_year < 1980:
-                            document_month = "no_month"
-                            document_year = "no_year"
-                    else:
-                        document_month = "no_month"
-                        document_year = "no_year"
-
-                # If that fails, just use regular OCR read the title as a dirty fix/fallback
-                except Exception as e:
-                    document_subject = "placeholder_document_name"
-                    document_type = "other"
-                    sent_from = "N/A"
-                    document_month = "no_month"
-                    document_year = "no_year"
+        if event.src_path.endswith(".pdf"):
+            self.track(event.src_path)
 
-                    self.logger.warning(f"Error! {e}")
-                    self.logger.warning(
-                        "Ollama OCR offload failed. Using defaults for missing values")
+    def on_moved(self, event):
+        # Scanners often write to a temporary name and rename the file once done
+        if event.is_directory:
+            return None
 
-                    Notification.objects.create(
-                        type="warning",
-                        audience="staff",
-                        content=f"Ollama OCR failed for document {document_subject}. Please check if the Ollama API is reachable.")
+        self.untrack(event.src_path)
+        if event.dest_path.endswith(".pdf"):
+            self.logger.info(f"PDF file moved in: {event.dest_path}")
+            self.track(event.dest_path)
 
-                metadata += text
+    def process_pdf(self, file_path, job=None, timings=None):
+        # timings, if given, is filled with the seconds spent in each stage
+        timings = {} if timings is None else timings
+        filename = os.path.basename(file_path)
+        try:
+            stage_start = time.perf_counter()
 
-            # Open the file for instance creation
+            # Check for duplicates by content before doing any OCR or LLM work
+            content_hash = file_sha256(file_path)
+            stage_start = record_stage(timings, "hash", stage_start)
             DOCUMENT = Document.objects.filter(
-                name=document_subject).first()
-            if not DOCUMENT:
-                DOCUMENT = Document.objects.create(
-                    name=document_subject,
-                    number_pages=num_pages,
-                    ocr_metadata=metadata,
-                    document_type=document_type,
-                    sent_from=sent_from,
-                    document_month=document_month,
-                    document_year=document_year,
-                    subject=document_subject
-                )
-
-                DOCUMENT.file.save(
-                    name=filename, content=File(open(file_path, "rb")))
-
-                self.logger.info(
-                    f"Document created successfully from '{filename}' with type '{
-                        document_type}'. sent_from: {sent_from}, document_month: {document_month}, document_year: {document_year}"
-                )
-
-                Notification.objects.create(
-                    type="info",
-                    audience="staff",
-                    content=f"New Document Scanned: {document_subject}.")
-
-            else:
-                self.logger.info(
-                    f"Document '{document_subject}' already exists.")
-                Notification.objects.create(
-                    type="info",
-                    audience="staff",
-                    content=f"Skipping Scanned Document {document_subject}: Already exists.")
-
+                content_hash=content_hash).first()
+            if DOCUMENT:
+                return self.store_duplicate(DOCUMENT, file_path, job, timings)
+
+            DOCUMENT, extraction = self.read_pdf(
+                file_path, content_hash, timings, job=job)
+            stage_start = time.perf_counter()
+
+            # Links the scan into its upload_to location before the row is saved, so a document is never committed
+            # without its file. The scan is only removed from the inbox once the row is committed
+            stored = store_file(DOCUMENT.file, file_path,
+                                filename, keep_source=True, save=False)
+            stage_start = record_stage(timings, "store", stage_start)
+
+            try:
+                with transaction.atomic():
+                    DOCUMENT.save()
+                    ExtractionRun.objects.bulk_create(
+                        self.extraction_runs(DOCUMENT, extraction))
+            except Exception as e:
+                DOCUMENT.file.storage.delete(stored)
+                # The same scan was stored by another worker while this one was reading it
+                existing = Document.objects.filter(
+                    content_hash=content_hash).first() if isinstance(e, IntegrityError) else None
+                if existing:
+                    return self.store_duplicate(existing, file_path, job, timings)
+                raise
             os.remove(file_path)
+            stage_start = record_stage(timings, "db", stage_start)
+
+            self.logger.info(
+                f"Document created successfully from '{filename}' with type '{DOCUMENT.document_type}'. sent_from: {DOCUMENT.sent_from}, document_month: {DOCUMENT.document_month}, document_year: {DOCUMENT.document_year}"
+            )
+
+            Notification.objects.create(
+                type="info",
+                audience="staff",
+                content=f"New Document Scanned: {DOCUMENT.subject}.")
+
+            if job:
+                job.mark_stored(DOCUMENT)
+            record_stage(timings, "db", stage_start)
+            self.record_document(filename, "stored", timings, document_id=DOCUMENT.id, text_source=extraction["text_source"],
+                                 local_fields=len(FIELD_NAMES) - len(extraction["missing_fields"]), ollama_calls=len(extraction["runs"]))
+            return DOCUMENT
         except Exception as e:
             self.logger.error(f"Error processing PDF: {str(e)}")
+            self.record_document(filename, "error", timings, error=str(e))
+            # Let the caller decide whether to retry
+            raise
+
+    def store_duplicate(self, DOCUMENT, file_path, job, timings):
+        # Handles a scan whose contents are already stored as DOCUMENT
+        filename = os.path.basename(file_path)
+        self.logger.info(
+            f"'{filename}' is a duplicate of document '{DOCUMENT.name}' (ID:{DOCUMENT.id}).")
+        if DOCUMENT.file:
+            Notification.objects.create(
+                type="info",
+                audience="staff",
+                content=f"Skipping Scanned Document {filename}: Already exists as {DOCUMENT.name}.")
+            os.remove(file_path)
+        else:
+            # The document was saved without its file, so this scan is the only copy. Store it instead of deleting it
+            store_file(DOCUMENT.file, file_path, filename)
+            self.logger.info(
+                f"Stored '{filename}' as the missing file of document (ID:{DOCUMENT.id}).")
+
+        if job:
+            job.mark_stored(DOCUMENT)
+        self.record_document(filename, "duplicate", timings,
+                             document_id=DOCUMENT.id)
+        return DOCUMENT
+
+    def read_pdf(self, file_path, content_hash, timings, job=None, notify=True):
+        # Reads the first page of a PDF and works out its fields. Returns an unsaved Document,
+        # along with what the extraction needed so it can be recorded once the document is saved
+        stage_start = time.perf_counter()
+        filename = os.path.basename(file_path)
+        metadata = ""
+
+        # Render and read only the first page in a worker process
+        num_pages, img_bytes, text = self.ocr_executor.submit(
+            render_first_page, file_path).result()
+        stage_start = record_stage(timings, "render", stage_start)
+
+        # Only perform OCR if the PDF has no usable text layer
+        if is_text_usable(text):
+            text_source = "text"
+        else:
+            if job:
+                job.set_status("ocr")
+            text = self.ocr_executor.submit(ocr_image, img_bytes).result()
+            text_source = "ocr"
+            stage_start = record_stage(timings, "ocr", stage_start)
+
+        if job:
+            job.set_status("extracting")
+
+        # Read what we can from the OCR text first. Only fields the rules are unsure of are sent to Ollama
+        fields = {
+            name: value for name, (value, confidence) in extract_rule_fields(text).items() if confidence >= RULES_CONFIDENCE_THRESHOLD
+        }
+
+        # Then try the local classifier, which is much faster than asking Ollama for the category
+        if "category" not in fields:
+            self.classifier.refresh()
+            category, similarity = self.classifier.predict(text)
+            if category:
+                fields["category"] = category
+                self.logger.info(
+                    f"Classified '{filename}' as '{category}' (similarity {similarity:.2f})")
+
+        missing_fields = [
+            name for name in FIELD_NAMES if name not in fields]
+        # (mode, model, elapsed, cached) for each Ollama call, recorded once the document exists
+        runs = []
+        agreement = None
+
+        if not missing_fields:
+            self.logger.info(
+                f"All fields for '{filename}' were read from the OCR text. Skipping Ollama")
+        else:
+            # Try to pass image to the Ollama image recognition API first
+            try:
+                possible_categories = set(DocumentType.names()) | {
+                    "Documented Procedures Manual", "Form", "Special Order", "Memorandum"}
+
+                # Use the OCR text with the cheaper text model when there is enough of it to work from
+                mode = EXTRACTION_MODE
+                if mode != "vision" and not is_text_suitable(text):
+                    self.logger.info(
+                        f"OCR text of '{filename}' is too short or unreadable for text extraction. Using the page image")
+                    mode = "vision"
+
+                text_result = None
+                if mode in ("text", "compare"):
+                    try:
+                        # Time spent waiting on Ollama is its own stage, everything else here counts as "extract"
+                        stage_start = record_stage(
+                            timings, "extract", stage_start)
+                        try:
+                            text_result, extraction_time, cached = extract_fields_from_text(
+                                text, possible_categories, missing_fields)
+                        finally:
+                            stage_start = record_stage(
+                                timings, "llm", stage_start)
+                        runs.append(("text", OLLAMA_TEXT_MODEL or get_secret(
+                            "OLLAMA_MODEL"), extraction_time, cached))
+                        self.logger.info(
+                            f"Text extraction of {missing_fields} for '{filename}' took {extraction_time:.2f}s{' (cached)' if cached else ''}")
+                    except Exception as e:
+                        if mode == "text" or isinstance(e, (OllamaUnavailable, *OLLAMA_ERRORS)):
+                            raise
+                        # A bad text response should not stop the comparison from using the vision result
+                        self.logger.warning(
+                            f"Text extraction for '{filename}' failed: {e}")
+
+                if mode == "text":
+                    result = text_result
+                else:
+                    # Send a smaller version of the page to keep the payload and model input small
+                    start_time = time.perf_counter()
+                    llm_img_bytes = prepare_llm_image(img_bytes)
+                    preparation_time = time.perf_counter() - start_time
+
+                    # Extract all remaining fields in a single pass so the page image is only uploaded once
+                    stage_start = record_stage(timings, "extract", stage_start)
+                    try:
+                        result, extraction_time, cached = extract_fields(
+                            llm_img_bytes, possible_categories, missing_fields)
+                    finally:
+                        stage_start = record_stage(timings, "llm", stage_start)
+                    runs.append(("vision", get_secret(
+                        "OLLAMA_MODEL"), extraction_time, cached))
+                    self.logger.info(
+                        f"Vision extraction of {missing_fields} for '{filename}' took {extraction_time:.2f}s{' (cached)' if cached else ''}. "
+                        f"Image variant: {llm_image_variant()}, {len(img_bytes)} -> {len(llm_img_bytes)} bytes, prepared in {preparation_time * 1000:.0f}ms")
+
+                if mode == "compare" and text_result:
+                    agreement = compare_fields(
+                        result, text_result, missing_fields)
+                    self.logger.info(
+                        f"Text and vision extraction for '{filename}' agreed on {sum(agreement.values())} of {len(agreement)} field(s): {agreement}")
+
+                for name in missing_fields:
+                    fields[name] = getattr(result, name)
+
+            # If that fails, just use regular OCR read the title as a dirty fix/fallback
+            except Exception as e:
+                fields.setdefault("subject", "placeholder_document_name")
+                metrics.inc("ingestion_ollama_errors_total")
+
+                self.logger.warning(f"Error! {e}")
+                self.logger.warning(
+                    "Ollama OCR offload failed. Using defaults for missing values")
+
+                # Outages are reported once by the circuit breaker instead of once per document
+                if notify and not isinstance(e, (OllamaUnavailable, *OLLAMA_ERRORS)):
+                    Notification.objects.create(
+                        type="warning",
+                        audience="staff",
+                        content=f"Ollama OCR failed for document {filename}. Using default values.")
+
+        # Fall back to defaults for any field that could not be determined
+        document_type = (fields.get("category") or "").strip() or "other"
+        sent_from = (fields.get("sent_from") or "").strip() or "N/A"
+        document_subject = (fields.get("subject") or "").strip() or "N/A"
+        document_date = fields.get("document_date")
+
+        if document_date:
+            document_month = document_date.strftime("%B")
+            document_year = document_date.year
+            # Set as none for invalid dates
+            if document_year < 1980:
+                document_month = "no_month"
+                document_year = "no_year"
+        else:
+            document_month = "no_month"
+            document_year = "no_year"
+
+        metadata += text
+        record_stage(timings, "extract", stage_start)
+
+        DOCUMENT = Document(
+            name=document_subject,
+            number_pages=num_pages,
+            ocr_metadata=metadata,
+            text_sources=[text_source],
+            # Only the first page is read by the watcher
+            ocr_status="done",
+            ocr_pages_done=1,
+            document_type=document_type,
+            sent_from=sent_from,
+            document_month=document_month,
+            document_year=document_year,
+            subject=document_subject,
+            content_hash=content_hash
+        )
+        extraction = {
+            "text_source": text_source,
+            "missing_fields": missing_fields,
+            "runs": runs,
+            "agreement": agreement,
+        }
+        return DOCUMENT, extraction
+
+    def extraction_runs(self, DOCUMENT, extraction):
+        # One ExtractionRun for each Ollama call made for the document
+        return [
+            ExtractionRun(mode=run_mode, model=run_model, document=DOCUMENT, fields=extraction["missing_fields"], elapsed=run_elapsed,
+                          cached=run_cached, agreement=extraction["agreement"] if run_mode == "text" else None)
+            for run_mode, run_model, run_elapsed, run_cached in extraction["runs"]
+        ]
 
 
 class PDFWatcher:
@@ -290,8 +612,11 @@ class PDFWatcher:
         event_handler = PDFHandler()
         watch_directory = os.path.join(MEDIA_ROOT, "uploads")
 
+        event_handler.start()
         self.observer.schedule(event_handler, watch_directory, recursive=True)
         self.observer.start()
+        # Scan after the observer has started so no file is missed in between. Files seen by both are only tracked once
+        event_handler.scan(watch_directory)
 
         try:
             while True:
@@ -299,7 +624,9 @@ class PDFWatcher:
         except:
             self.observer.stop()
 
+        # Stop accepting new files first, then let the workers drain the queue
         self.observer.join()
+        event_handler.shutdown()
 
 
 class Command(BaseCommand):
@@ -24,11 +24,14 @@ ROOT_DIR = Path(__file__).resolve().parent.parent.parent
 load_dotenv(find_dotenv())
 
 
-def get_secret(secret_name):
+def get_secret(secret_name, default=None):
     # Read from .env
     secret_value = os.getenv(secret_name)
 
     if secret_value is None:
+        # Optional secrets fall back to their default instead of failing
+        if default is not None:
+            return default
         raise ValueError(f"Secret '{secret_name}' not found.")
     else:
         # Parse Boolean values
@@ -143,6 +146,10 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Give concurrent writers (watcher workers, gunicorn) time to wait for the write lock
+            "timeout": 20,
+        },
     }
 }
 
@@ -203,6 +210,8 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 ROOT_URLCONF = "config.urls"
 STATIC_URL = "static/"
 STATIC_ROOT = os.path.join(BASE_DIR, "static")
+# On-disk caches used by OCR and document ingestion
+CACHE_DIR = os.path.join(BASE_DIR, "cache")
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
@@ -273,3 +282,104 @@ GRAPH_MODELS = {
 
 CORS_ORIGIN_ALLOW_ALL = True
 CORS_ALLOW_CREDENTIALS = True
+
+# Document Watcher
+# Number of threads pulling files off the ingestion queue (Ollama calls run here)
+WATCHER_WORKERS = int(get_secret("WATCHER_WORKERS", 4))
+# Number of processes used for PDF rendering and Tesseract OCR
+WATCHER_OCR_PROCESSES = int(get_secret("WATCHER_OCR_PROCESSES", os.cpu_count() or 1))
+# Maximum number of files waiting for a worker before the watcher stops accepting new ones
+WATCHER_QUEUE_SIZE = int(get_secret("WATCHER_QUEUE_SIZE", 64))
+# Number of times a file is attempted before its ingestion job is marked as failed
+WATCHER_MAX_ATTEMPTS = int(get_secret("WATCHER_MAX_ATTEMPTS", 3))
+# Seconds to wait before the first retry. Doubles on every failed attempt
+WATCHER_RETRY_BACKOFF = int(get_secret("WATCHER_RETRY_BACKOFF", 30))
+# Seconds between checks for queued jobs that are due for a retry
+WATCHER_POLL_INTERVAL = int(get_secret("WATCHER_POLL_INTERVAL", 5))
+# Seconds a new file's size and modification time must stay the same before it is processed
+WATCHER_STABLE_SECONDS = float(get_secret("WATCHER_STABLE_SECONDS", 2))
+
+# Metrics
+# Folder the watcher and each web server process write their metrics to, as Prometheus text (.prom) and JSON
+METRICS_DIR = get_secret("METRICS_DIR", os.path.join(CACHE_DIR, "metrics"))
+# Seconds between metric writes
+METRICS_INTERVAL = int(get_secret("METRICS_INTERVAL", 15))
+
+# OCR
+# Pages with less embedded text than this are treated as scans and sent to Tesseract
+OCR_MIN_TEXT_LENGTH = int(get_secret("OCR_MIN_TEXT_LENGTH", 20))
+# Minimum share of letters, digits and whitespace in the embedded text for it to be used as is
+OCR_MIN_TEXT_QUALITY = float(get_secret("OCR_MIN_TEXT_QUALITY", 0.8))
+# Number of background threads per server process used to OCR uploaded documents
+OCR_BACKGROUND_WORKERS = int(get_secret("OCR_BACKGROUND_WORKERS", 2))
+# Number of gunicorn workers started by scripts/start.sh. Each one has its own background OCR threads and processes
+WEB_WORKERS = int(get_secret("WEB_WORKERS", 8))
+# Number of processes each server process uses to read the pages of uploaded documents in parallel. Every web worker
+# has its own pool, next to the watcher's WATCHER_OCR_PROCESSES, so the default splits the cores between the workers.
+# Processes only start once a document is read
+OCR_PROCESSES = int(get_secret("OCR_PROCESSES", max(1, (os.cpu_count() or 1) // WEB_WORKERS)))
+# Maximum number of pages handed to an OCR process at a time
+OCR_PAGES_PER_TASK = int(get_secret("OCR_PAGES_PER_TASK", 4))
+# Seconds Tesseract may spend on a single page before it is skipped (0 disables the timeout)
+OCR_PAGE_TIMEOUT = int(get_secret("OCR_PAGE_TIMEOUT", 60))
+# Background OCR is queued in memory, so documents whose server process stopped are queued again by the watcher.
+# Documents processing for longer than this many seconds are treated as stopped, so keep it above the longest OCR run
+OCR_STALE_SECONDS = int(get_secret("OCR_STALE_SECONDS", 1800))
+# Seconds between the watcher's checks for stopped OCR
+OCR_REQUEUE_INTERVAL = int(get_secret("OCR_REQUEUE_INTERVAL", 300))
+# Tesseract language(s) used for OCR, e.g. "eng" or "eng+fil"
+OCR_LANGUAGE = get_secret("OCR_LANGUAGE", "eng")
+# OCR results are cached by page image so re-scans and re-uploads skip Tesseract. Set entries to 0 to disable
+OCR_CACHE_PATH = get_secret("OCR_CACHE_PATH", os.path.join(CACHE_DIR, "ocr.sqlite3"))
+OCR_CACHE_MAX_ENTRIES = int(get_secret("OCR_CACHE_MAX_ENTRIES", 50000))
+OCR_CACHE_MAX_MB = int(get_secret("OCR_CACHE_MAX_MB", 256))
+
+# Seconds the list of document types is cached by each process before changes from other processes show up
+DOCUMENT_TYPES_CACHE_TTL = int(get_secret("DOCUMENT_TYPES_CACHE_TTL", 60))
+
+# Search
+# Search words are also matched against indexed words that look alike, to get past OCR errors like "Memorandurn"
+SEARCH_FUZZY = get_secret("SEARCH_FUZZY", True)
+# Minimum trigram similarity (0 to 1) for an indexed word to count as a match, and the most alike words used per search word
+SEARCH_TRIGRAM_THRESHOLD = float(get_secret("SEARCH_TRIGRAM_THRESHOLD", 0.4))
+SEARCH_FUZZY_MAX_TERMS = int(get_secret("SEARCH_FUZZY_MAX_TERMS", 5))
+
+# Ollama Extraction
+# Fields read from the OCR text with at least this confidence (0 to 1) are not sent to Ollama
+RULES_CONFIDENCE_THRESHOLD = float(get_secret("RULES_CONFIDENCE_THRESHOLD", 0.8))
+# The local category classifier is trusted when the closest category has at least this cosine similarity (0 to 1)
+# and beats the next closest by the margin. Otherwise the category is left to Ollama
+CLASSIFIER_MIN_SIMILARITY = float(get_secret("CLASSIFIER_MIN_SIMILARITY", 0.3))
+CLASSIFIER_MIN_MARGIN = float(get_secret("CLASSIFIER_MIN_MARGIN", 0.1))
+# Number of characters of each document used by the classifier
+CLASSIFIER_MAX_CHARS = int(get_secret("CLASSIFIER_MAX_CHARS", 5000))
+# Seconds to wait for a connection to Ollama, and for a response once connected
+OLLAMA_CONNECT_TIMEOUT = float(get_secret("OLLAMA_CONNECT_TIMEOUT", 5))
+OLLAMA_READ_TIMEOUT = float(get_secret("OLLAMA_READ_TIMEOUT", 120))
+# Maximum number of open connections to Ollama per process
+OLLAMA_MAX_CONNECTIONS = int(get_secret("OLLAMA_MAX_CONNECTIONS", 8))
+# Ollama is skipped for the cooldown (seconds) after this many failed calls in a row
+OLLAMA_FAILURE_THRESHOLD = int(get_secret("OLLAMA_FAILURE_THRESHOLD", 3))
+OLLAMA_COOLDOWN = int(get_secret("OLLAMA_COOLDOWN", 60))
+# How fields are extracted. "vision" sends the page image to OLLAMA_MODEL, "text" sends the OCR text to OLLAMA_TEXT_MODEL
+# and "compare" runs both, keeps the vision result and records how often they agree
+EXTRACTION_MODE = get_secret("EXTRACTION_MODE", "vision")
+# Model used in text mode. Defaults to OLLAMA_MODEL
+OLLAMA_TEXT_MODEL = get_secret("OLLAMA_TEXT_MODEL", "")
+# OCR text shorter than this, or with too many stray symbols, is sent to the vision model instead
+EXTRACTION_TEXT_MIN_LENGTH = int(get_secret("EXTRACTION_TEXT_MIN_LENGTH", 200))
+# Maximum number of characters of OCR text sent to the text model
+EXTRACTION_TEXT_MAX_CHARS = int(get_secret("EXTRACTION_TEXT_MAX_CHARS", 4000))
+# Extraction results are cached by page image or text, prompt version and model. Set entries to 0 to disable
+EXTRACTION_CACHE_PATH = get_secret("EXTRACTION_CACHE_PATH", os.path.join(CACHE_DIR, "extraction.sqlite3"))
+EXTRACTION_CACHE_MAX_ENTRIES = int(get_secret("EXTRACTION_CACHE_MAX_ENTRIES", 20000))
+# Seconds before a cached extraction expires
+EXTRACTION_CACHE_TTL = int(get_secret("EXTRACTION_CACHE_TTL", 30 * 24 * 60 * 60))
+# Image sent to the vision model. Crop is the share of the page kept from the top (1 keeps the whole page)
+LLM_IMAGE_CROP = float(get_secret("LLM_IMAGE_CROP", 0.5))
+LLM_IMAGE_GRAYSCALE = get_secret("LLM_IMAGE_GRAYSCALE", True)
+# Longest side in pixels. Larger pages are scaled down (0 keeps the rendered size)
+LLM_IMAGE_MAX_SIZE = int(get_secret("LLM_IMAGE_MAX_SIZE", 1024))
+# JPEG, WEBP or PNG
+LLM_IMAGE_FORMAT = get_secret("LLM_IMAGE_FORMAT", "JPEG")
+LLM_IMAGE_QUALITY = int(get_secret("LLM_IMAGE_QUALITY", 80))
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
 application = get_wsgi_application()
+
+# Each worker writes its own metrics file so the metrics endpoint can combine every worker's numbers
+from documents.metrics import metrics, web_process  # noqa: E402
+
+metrics.start_writer(web_process())
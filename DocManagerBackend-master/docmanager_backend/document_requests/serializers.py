@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from documents.models import Document
-from documents.serializers import DocumentSerializer, DocumentFileSerializer
+from documents.serializers import DocumentSummarySerializer, DocumentFileSummarySerializer
 from questionnaires.models import Questionnaire
 from accounts.models import CustomUser
 from emails.templates import RequestUpdateEmail
@@ -70,7 +70,7 @@ class DocumentRequestCreationSerializer(serializers.ModelSerializer):
 
 
 class DocumentRequestUnitSerializer(serializers.ModelSerializer):
-    document = DocumentSerializer(many=False)
+    document = DocumentSummarySerializer(many=False)
 
     class Meta:
         model = DocumentRequestUnit
@@ -79,7 +79,7 @@ class DocumentRequestUnitSerializer(serializers.ModelSerializer):
 
 
 class DocumentRequestUnitWithFileSerializer(serializers.ModelSerializer):
-    document = DocumentFileSerializer(many=False)
+    document = DocumentFileSummarySerializer(many=False)
 
     class Meta:
         model = DocumentRequestUnit
@@ -130,6 +130,8 @@ class DocumentRequestSerializer(serializers.ModelSerializer):
             "remarks,"
             "status",
         ]
+        # Model fields read by get_documents, for SparseFieldsMixin
+        field_sources = {"documents": ["questionnaire", "status"]}
 
     def get_documents(self, obj):
         if obj.questionnaire and obj.status == "approved":
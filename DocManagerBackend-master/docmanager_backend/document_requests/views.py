@@ -2,6 +2,7 @@ from rest_framework import generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
 from accounts.permissions import IsHead, IsStaff
+from api.mixins import SparseFieldsMixin
 from rest_framework.pagination import PageNumberPagination
 from .serializers import (
     DocumentRequestCreationSerializer,
@@ -10,15 +11,25 @@ from .serializers import (
     FullDocumentRequestSerializer
 )
 
-from .models import DocumentRequest
+from .models import DocumentRequest, DocumentRequestUnit
 
-from django.db.models import Case, When, Value, IntegerField, F
+from django.db.models import Case, When, Value, IntegerField, F, Prefetch
 
 class DocumentRequestPagination(PageNumberPagination):
     page_size = 7
     page_size_query_param = 'page_size'
     max_page_size = 7
 
+class DocumentRequestDocumentsMixin(SparseFieldsMixin):
+    # Loads the requested documents of every request on the page in one query, without their OCR text
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.wants_field("documents"):
+            queryset = queryset.prefetch_related(Prefetch("documents", queryset=DocumentRequestUnit.objects.select_related(
+                "document").defer("document__ocr_metadata")))
+        return queryset
+
+
 class DocumentRequestCreateView(generics.CreateAPIView):
     """
     Used by clients to create document requests. Requires passing in request information in addition to the documents themselves
@@ -29,7 +40,7 @@ class DocumentRequestCreateView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated]
 
 
-class DocumentRequestListView(generics.ListAPIView):
+class DocumentRequestListView(DocumentRequestDocumentsMixin, generics.ListAPIView):
     """
     Returns document requests. If document requests are approved, also returns the link to download the document.
     Staff are able to view all document requests here. Clients are only able to view their own requests.
@@ -72,7 +83,7 @@ class DocumentRequestListView(generics.ListAPIView):
 
         return queryset
     
-class WidgetDocumentRequestListView(generics.ListAPIView):
+class WidgetDocumentRequestListView(DocumentRequestDocumentsMixin, generics.ListAPIView):
     """
     Returns document requests. If document requests are approved, also returns the link to download the document.
     Staff are able to view all document requests here. Clients are only able to view their own requests.
@@ -92,7 +103,7 @@ class WidgetDocumentRequestListView(generics.ListAPIView):
         return queryset
 
 
-class DocumentRequestFullListView(generics.ListAPIView):
+class DocumentRequestFullListView(DocumentRequestDocumentsMixin, generics.ListAPIView):
     """
     Returns document requests with filtering by status, document_month, and document_year
     from the related Document model.
@@ -146,7 +157,7 @@ class DocumentRequestUpdateView(generics.UpdateAPIView):
     permission_classes = [IsAuthenticated, IsHead]
     queryset = DocumentRequest.objects.all()
 
-class WidgetDocumentRequestFullListView(generics.ListAPIView):
+class WidgetDocumentRequestFullListView(DocumentRequestDocumentsMixin, generics.ListAPIView):
     """
     Returns document requests. Always returns the link to download the document.
     Head is able to view all document requests here. Clients have no access, only staff.
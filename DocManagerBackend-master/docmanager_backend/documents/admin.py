@@ -1,7 +1,7 @@
 from django.contrib import admin
 from unfold.admin import ModelAdmin
 
-from .models import Document
+from .models import Document, DocumentType, IngestionJob, ExtractionRun
 
 
 @admin.register(Document)
@@ -11,3 +11,26 @@ class DocumentAdmin(ModelAdmin):
                      "document_month", "document_type"]
     list_display = ["id", "name", "subject", "sent_from", "document_year",
                     "document_month", "document_type", "date_uploaded"]
+
+
+@admin.register(DocumentType)
+class DocumentTypeAdmin(ModelAdmin):
+    model = DocumentType
+    search_fields = ["id", "name"]
+    list_display = ["id", "name", "count"]
+
+
+@admin.register(IngestionJob)
+class IngestionJobAdmin(ModelAdmin):
+    model = IngestionJob
+    search_fields = ["id", "file_path", "status"]
+    list_display = ["id", "file_path", "status", "attempts", "document",
+                    "date_created", "date_updated", "next_attempt"]
+
+
+@admin.register(ExtractionRun)
+class ExtractionRunAdmin(ModelAdmin):
+    model = ExtractionRun
+    search_fields = ["id", "mode", "model"]
+    list_display = ["id", "mode", "model", "document", "elapsed", "cached",
+                    "agreement", "date_created"]
@@ -0,0 +1,152 @@
+import json
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import fitz
+
+# Helpers for the benchmark_ingestion command: a stand-in for the Ollama API and a generator of scanned-looking PDFs
+
+# Values the fake Ollama server answers with, by schema field name
+CANNED_FIELDS = {
+    "category": "Memorandum",
+    "sent_from": "Office of the Benchmark",
+    "subject": "Benchmark Document",
+    "document_date": "2024-01-15",
+    "explanation": "Canned response from the benchmark server",
+}
+
+WORDS = (
+    "office", "university", "faculty", "students", "schedule", "enrollment", "meeting", "department", "memorandum",
+    "order", "personnel", "designation", "effective", "immediately", "attendance", "required", "semester", "campus",
+    "budget", "request", "approval", "committee", "report", "program", "activity", "training", "seminar", "policy",
+    "compliance", "procedure", "manual", "records", "submission", "deadline", "evaluation", "instruction", "research",
+)
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.respond(200, b"Ollama is running", "text/plain")
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/api/chat":
+            return self.respond(404, b'{"error": "not found"}')
+
+        request = json.loads(body or b"{}")
+        # Answer with the fields the request's JSON schema asks for
+        properties = (request.get("format") or {}).get("properties", {})
+        content = {name: CANNED_FIELDS.get(name) for name in properties}
+
+        time.sleep(self.server.latency)
+        self.respond(200, json.dumps({
+            "model": request.get("model", ""),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "message": {"role": "assistant", "content": json.dumps(content)},
+            "done": True,
+            "done_reason": "stop",
+        }).encode())
+
+    def respond(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep request logs out of the benchmark output
+        pass
+
+
+class FakeOllamaServer:
+    # Runs a fake Ollama API on a free local port in a background thread. latency is in seconds per chat request
+    def __init__(self, latency=0.5):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FakeOllamaHandler)
+        self.server.daemon_threads = True
+        self.server.latency = latency
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name="Fake-Ollama", daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+def synthetic_text(rng, tag, headers=False):
+    # tag is included so every generated document has a distinct hash and never hits a cache
+    lines = []
+    if headers:
+        lines += [
+            "MEMORANDUM",
+            "FOR : All Faculty and Staff",
+            "FROM : Office of the Benchmark",
+            f"SUBJECT: {' '.join(rng.choices(WORDS, k=5)).title()}",
+            "DATE : January 15, 2024",
+            "",
+        ]
+    lines += [" ".join(rng.choices(WORDS, k=10)).capitalize() +
+              "." for _ in range(25)]
+    lines.append(f"Reference: {tag}")
+    return "\n".join(lines)
+
+
+def make_pdf(file_path, text, pages=1, image_only=False):
+    # Writes a PDF with the text on every page. Image-only PDFs have each page replaced by a grayscale scan of itself,
+    # so they have no text layer and have to go through OCR
+    doc = fitz.open()
+    for _ in range(pages):
+        page = doc.new_page()
+        # insert_textbox writes nothing if the text does not fit, so shrink the font until it does
+        fontsize = 11
+        while page.insert_textbox(page.rect + (54, 54, -54, -54), text, fontsize=fontsize) < 0 and fontsize > 4:
+            fontsize -= 1
+
+    if image_only:
+        scanned = fitz.open()
+        for page in doc:
+            pix = page.get_pixmap(dpi=150, colorspace=fitz.csGRAY)
+            scanned_page = scanned.new_page(
+                width=page.rect.width, height=page.rect.height)
+            scanned_page.insert_image(scanned_page.rect, pixmap=pix)
+        doc.close()
+        doc = scanned
+
+    doc.save(file_path)
+    doc.close()
+
+
+def generate_pdfs(directory, count, image_ratio=0.5, pages=1, headers=False, seed=None):
+    # Returns the paths of the generated files. Image-only files are spread evenly through the batch
+    rng = random.Random(seed)
+    run_id = f"{time.time_ns():x}"
+    file_paths = []
+    for i in range(count):
+        image_only = int((i + 1) * image_ratio) > int(i * image_ratio)
+        file_path = os.path.join(
+            directory, f"benchmark_{run_id}_{i:05d}.pdf")
+        make_pdf(file_path, synthetic_text(rng, f"{run_id}-{i}", headers=headers),
+                 pages=pages, image_only=image_only)
+        file_paths.append(file_path)
+    return file_paths
+
+
+def percentile(values, percent):
+    # Nearest-rank percentile
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+import threading
+import time
+
+# A small key/value cache stored in its own SQLite file.
+# It does not use the Django ORM so it can be shared by the web server, the watcher and OCR worker processes
+
+
+class DiskCache:
+    def __init__(self, path, max_entries=0, max_bytes=0, ttl=0):
+        # max_entries, max_bytes and ttl (seconds) are disabled when set to 0
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.local = threading.local()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, size INTEGER, created REAL, accessed REAL)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)")
+
+    def connection(self):
+        # SQLite connections cannot be shared between threads, so each thread opens its own
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self.local.connection = connection
+        return connection
+
+    def get(self, key):
+        with self.connection() as connection:
+            row = connection.execute(
+                "SELECT value, created FROM entries WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl and row[1] < time.time() - self.ttl:
+                connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                row = None
+
+            if row:
+                # Touch the entry so it is evicted last
+                connection.execute(
+                    "UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.count(connection, "hits" if row else "misses")
+        return row[0] if row else None
+
+    def set(self, key, value):
+        now = time.time()
+        with self.connection() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value), now, now),
+            )
+            self.evict(connection)
+
+    def evict(self, connection):
+        # Drop the least recently used entries until the cache fits its limits
+        if self.ttl:
+            connection.execute(
+                "DELETE FROM entries WHERE created < ?", (time.time() - self.ttl,))
+
+        entries, size = connection.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        evicted = 0
+        if self.max_entries and entries > self.max_entries:
+            evicted = entries - self.max_entries
+        if self.max_bytes and size > self.max_bytes:
+            # Walk from the oldest entry until enough bytes are freed
+            freed = 0
+            oldest = 0
+            for (entry_size,) in connection.execute("SELECT size FROM entries ORDER BY accessed"):
+                if size - freed <= self.max_bytes:
+                    break
+                freed += entry_size
+                oldest += 1
+            evicted = max(evicted, oldest)
+        if evicted:
+            connection.execute(
+                "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY accessed LIMIT ?)", (evicted,))
+            self.count(connection, "evictions", evicted)
+
+    def count(self, connection, name, amount=1):
+        connection.execute(
+            "INSERT INTO stats (name, value) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET value = value + ?",
+            (name, amount, amount),
+        )
+
+    def stats(self):
+        with self.connection() as connection:
+            stats = dict(connection.execute(
+                "SELECT name, value FROM stats").fetchall())
+            entries, size = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        hits = stats.get("hits", 0)
+        misses = stats.get("misses", 0)
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0,
+            "evictions": stats.get("evictions", 0),
+            "entries": entries,
+            "size_bytes": size,
+        }
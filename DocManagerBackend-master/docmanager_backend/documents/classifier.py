@@ -0,0 +1,117 @@
+import math
+import re
+import threading
+from collections import Counter
+import numpy as np
+from django.db.models import Max
+from config.settings import (
+    CLASSIFIER_MAX_CHARS,
+    CLASSIFIER_MIN_SIMILARITY,
+    CLASSIFIER_MIN_MARGIN
+)
+from .models import Document
+
+# Picks a document type from OCR text with TF-IDF and nearest centroid, trained on documents already in the database.
+# Used ahead of the LLM so it is only asked for the category when the classifier is unsure
+
+TOKEN_PATTERN = re.compile(r"[a-z]{3,}")
+
+# Categories the watcher falls back to are not real labels, so they are not learned from
+IGNORED_CATEGORIES = ("other",)
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text[:CLASSIFIER_MAX_CHARS].lower())
+
+
+class CategoryClassifier:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Highest document id trained on. Newer documents are added on the next refresh
+        self.last_id = 0
+        self.vocabulary = {}
+        self.categories = []
+        # Number of documents each term appears in, per term
+        self.document_frequency = np.zeros(0)
+        self.documents = 0
+        # Sum of the normalised term frequencies of every document in a category, one row per category
+        self.term_sums = np.zeros((0, 0))
+
+    def term_frequencies(self, text, grow=False):
+        # Sublinear term frequencies, normalised so long documents do not outweigh short ones
+        counts = Counter(tokenize(text))
+        if grow:
+            for term in counts:
+                if term not in self.vocabulary:
+                    self.vocabulary[term] = len(self.vocabulary)
+
+        vector = np.zeros(len(self.vocabulary))
+        for term, count in counts.items():
+            index = self.vocabulary.get(term)
+            if index is not None:
+                vector[index] = 1 + math.log(count)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def learn(self, text, category):
+        vector = self.term_frequencies(text, grow=True)
+        if not vector.any():
+            return
+
+        # Widen the arrays for terms seen for the first time
+        growth = len(self.vocabulary) - self.term_sums.shape[1]
+        if growth:
+            self.term_sums = np.pad(self.term_sums, ((0, 0), (0, growth)))
+            self.document_frequency = np.pad(
+                self.document_frequency, (0, growth))
+
+        if category not in self.categories:
+            self.categories.append(category)
+            self.term_sums = np.vstack(
+                (self.term_sums, np.zeros(len(self.vocabulary))))
+
+        self.term_sums[self.categories.index(category)] += vector
+        self.document_frequency += vector > 0
+        self.documents += 1
+
+    def refresh(self):
+        # Trains on documents added since the last refresh.
+        # Documents whose type is changed afterwards keep their old label until the watcher restarts
+        with self.lock:
+            latest = Document.objects.aggregate(latest=Max("id"))["latest"] or 0
+            # Documents whose text is still being read are waited for, so last_id stops short of the first of them
+            unfinished = Document.objects.filter(id__gt=self.last_id, id__lte=latest, ocr_status__in=(
+                "pending", "processing")).order_by("id").values_list("id", flat=True).first()
+            until = unfinished - 1 if unfinished else latest
+
+            rows = Document.objects.filter(id__gt=self.last_id, id__lte=until, ocr_status="done").exclude(
+                document_type__in=IGNORED_CATEGORIES).order_by("id").values_list("document_type", "ocr_metadata")
+            for category, text in rows.iterator():
+                if text:
+                    self.learn(text, category)
+            self.last_id = until
+
+    def predict(self, text):
+        # Returns the closest category and its cosine similarity. The category is None when the classifier is unsure
+        with self.lock:
+            if len(self.categories) < 2:
+                return None, 0
+
+            query = self.term_frequencies(text)
+            if not query.any():
+                return None, 0
+
+            idf = np.log((1 + self.documents) /
+                         (1 + self.document_frequency)) + 1
+            query = query * idf
+            centroids = self.term_sums * idf
+            norms = np.linalg.norm(centroids, axis=1) * \
+                np.linalg.norm(query)
+            similarities = centroids @ query / np.where(norms, norms, 1)
+
+            second, best = np.argsort(similarities)[-2:]
+            confidence = float(similarities[best])
+            # Reject matches that are weak, or too close to call between two categories
+            if confidence < CLASSIFIER_MIN_SIMILARITY or confidence - similarities[second] < CLASSIFIER_MIN_MARGIN:
+                return None, confidence
+            return self.categories[best], confidence
@@ -0,0 +1,272 @@
+import base64
+import hashlib
+import json
+import logging
+import threading
+import time
+import httpx
+from datetime import date
+from functools import cache
+from typing import Optional
+from ollama import Client, ResponseError
+from pydantic import BaseModel, create_model
+from config.settings import (
+    get_secret,
+    EXTRACTION_CACHE_PATH,
+    EXTRACTION_CACHE_MAX_ENTRIES,
+    EXTRACTION_CACHE_TTL,
+    OLLAMA_CONNECT_TIMEOUT,
+    OLLAMA_READ_TIMEOUT,
+    OLLAMA_MAX_CONNECTIONS,
+    OLLAMA_FAILURE_THRESHOLD,
+    OLLAMA_COOLDOWN,
+    OLLAMA_TEXT_MODEL,
+    EXTRACTION_TEXT_MIN_LENGTH,
+    EXTRACTION_TEXT_MAX_CHARS,
+    OCR_MIN_TEXT_QUALITY
+)
+from notifications.models import Notification
+from .cache import DiskCache
+
+logger = logging.getLogger(__name__)
+
+# Bump this whenever the prompt or schema below changes so stale cached extractions are not reused
+EXTRACTION_PROMPT_VERSION = 3
+
+# Fields that can be extracted from a document, in the order they are asked for
+FIELD_NAMES = ("category", "sent_from", "subject", "document_date")
+
+
+class DocumentSchema(BaseModel):
+    # Combined extraction schema. Every field has a default so a partial response still validates
+    category: Optional[str] = "other"
+    sent_from: Optional[str] = "N/A"
+    subject: Optional[str] = "N/A"
+    document_date: Optional[date] = None
+    explanation: Optional[str] = None
+
+
+@cache
+def schema_for(fields):
+    # Builds a schema with only the requested fields, so the model is not asked for values that are already known
+    if tuple(fields) == FIELD_NAMES:
+        return DocumentSchema
+    return create_model(
+        "DocumentSchema",
+        explanation=(Optional[str], None),
+        **{name: (DocumentSchema.model_fields[name].annotation, DocumentSchema.model_fields[name].default) for name in fields},
+    )
+
+
+def build_prompt(possible_categories, fields=FIELD_NAMES, text=None):
+    # Asks about the page image, or about the OCR text when it is given
+    field_prompts = {
+        "category": f"category: The type of the document. Possible document types are: {possible_categories}. You are free to create a new one if none are suitable.",
+        "sent_from": "sent_from: Who sent the document. Otherwise, return N/A.",
+        "subject": "subject: The subject of the document if it exists. Otherwise, return N/A.",
+        "document_date": "document_date: The date of the document if it exists. If you are unable to determine the date, return nothing.",
+    }
+    field_lines = "\n\n        ".join(field_prompts[name] for name in fields)
+    if text is None:
+        source = "Read the text from the image and extract the following fields:"
+    else:
+        source = f"The following text was read from a scanned document with OCR and may contain mistakes:\n\n{text}\n\n        From this text, extract the following fields:"
+    return f"""
+        {source}
+
+        {field_lines}
+
+        Do all of this and return your output in JSON.
+        """
+
+
+def is_text_suitable(text):
+    # The text model is only used when OCR returned enough readable text to work from.
+    # Otherwise the page image is sent to the vision model instead
+    if len(text) < EXTRACTION_TEXT_MIN_LENGTH:
+        return False
+    readable = sum(1 for char in text if char.isalnum() or char.isspace())
+    return readable / len(text) >= OCR_MIN_TEXT_QUALITY
+
+
+def normalize_field(value):
+    if isinstance(value, str):
+        return " ".join(value.casefold().split())
+    return value
+
+
+def compare_fields(first, second, fields):
+    # Returns {field: True/False} for whether two extraction results agree on each field
+    return {name: normalize_field(getattr(first, name)) == normalize_field(getattr(second, name)) for name in fields}
+
+
+class OllamaUnavailable(Exception):
+    # Raised instead of calling Ollama while the circuit breaker is open
+    pass
+
+
+# Errors that mean Ollama itself is unreachable or unhealthy, as opposed to a bad response for one document
+OLLAMA_ERRORS = (ConnectionError, httpx.TransportError, ResponseError)
+
+
+class CircuitBreaker:
+    # Stops calling Ollama for a cooldown period after repeated failures,
+    # so documents do not each wait for a connection that is going to fail
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.lock = threading.Lock()
+        self.failures = 0
+        self.opened_at = None
+        # True from the moment the breaker opens until a call succeeds again
+        self.outage = False
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.cooldown:
+                # Let one call through to check if Ollama is back
+                self.opened_at = None
+                self.failures = self.failure_threshold - 1
+                return True
+            return False
+
+    def record_success(self):
+        # Returns True if this ends an outage
+        with self.lock:
+            recovered = self.outage
+            self.failures = 0
+            self.opened_at = None
+            self.outage = False
+            return recovered
+
+    def record_failure(self):
+        # Returns True if this starts a new outage
+        with self.lock:
+            self.failures += 1
+            if self.failures < self.failure_threshold:
+                return False
+            self.opened_at = time.monotonic()
+            started = not self.outage
+            self.outage = True
+            return started
+
+
+breaker = CircuitBreaker(
+    failure_threshold=OLLAMA_FAILURE_THRESHOLD, cooldown=OLLAMA_COOLDOWN)
+
+
+@cache
+def get_client():
+    # One client per process, shared by every ingestion worker. httpx keeps a pool of connections to reuse
+    return Client(
+        host=get_secret("OLLAMA_URL"),
+        auth=httpx.BasicAuth(
+            username=get_secret("OLLAMA_USERNAME"), password=get_secret("OLLAMA_PASSWORD")) if get_secret("OLLAMA_USE_AUTH") else None,
+        timeout=httpx.Timeout(OLLAMA_READ_TIMEOUT,
+                              connect=OLLAMA_CONNECT_TIMEOUT),
+        limits=httpx.Limits(max_connections=OLLAMA_MAX_CONNECTIONS,
+                            max_keepalive_connections=OLLAMA_MAX_CONNECTIONS),
+    )
+
+
+def chat(**kwargs):
+    # Calls Ollama through the circuit breaker. Only connection problems count as failures
+    if not breaker.allow():
+        raise OllamaUnavailable(
+            f"Skipping Ollama for up to {OLLAMA_COOLDOWN}s after repeated failures")
+
+    try:
+        response = get_client().chat(**kwargs)
+    except OLLAMA_ERRORS as e:
+        if breaker.record_failure():
+            logger.warning(
+                f"Ollama is unreachable, pausing extraction for {OLLAMA_COOLDOWN}s: {e}")
+            Notification.objects.create(
+                type="warning",
+                audience="staff",
+                content="The Ollama API is unreachable. Scanned documents will use default values until it is back.")
+        raise
+
+    if breaker.record_success():
+        logger.info("Ollama is reachable again")
+        Notification.objects.create(
+            type="info",
+            audience="staff",
+            content="The Ollama API is reachable again.")
+    return response
+
+
+@cache
+def get_extraction_cache():
+    # One cache per process. Disabled when EXTRACTION_CACHE_MAX_ENTRIES is 0
+    if not EXTRACTION_CACHE_MAX_ENTRIES:
+        return None
+    return DiskCache(
+        EXTRACTION_CACHE_PATH,
+        max_entries=EXTRACTION_CACHE_MAX_ENTRIES,
+        ttl=EXTRACTION_CACHE_TTL,
+    )
+
+
+def extraction_cache_key(model, source, data, schema):
+    # Extraction runs at temperature 0, so the same input, prompt and model give the same answer
+    schema = hashlib.sha256(json.dumps(
+        schema.model_json_schema(), sort_keys=True).encode()).hexdigest()[:16]
+    digest = hashlib.sha256(data).hexdigest()
+    return f"{model}:v{EXTRACTION_PROMPT_VERSION}:{source}:{schema}:{digest}"
+
+
+def run_extraction(model, source, data, message, fields):
+    # Sends a single extraction request to Ollama, going through the extraction cache.
+    # Returns the parsed result, how long it took and whether it came from the cache
+    start_time = time.perf_counter()
+    schema = schema_for(tuple(fields))
+
+    extraction_cache = get_extraction_cache()
+    if extraction_cache:
+        key = extraction_cache_key(model, source, data, schema)
+        content = extraction_cache.get(key)
+        if content is not None:
+            return schema.model_validate_json(content), time.perf_counter() - start_time, True
+
+    response = chat(
+        model=model,
+        messages=[{"role": "user", **message}],
+        format=schema.model_json_schema(),
+        options={
+            "temperature": 0
+        },
+    )
+    content = response.message.content
+    result = schema.model_validate_json(content)
+
+    # Only responses that validate are cached
+    if extraction_cache:
+        extraction_cache.set(key, content)
+    return result, time.perf_counter() - start_time, False
+
+
+def extract_fields(img_bytes, possible_categories, fields=FIELD_NAMES):
+    # Extracts the requested fields from the page image with the vision model
+    return run_extraction(
+        get_secret("OLLAMA_MODEL"),
+        "vision",
+        img_bytes,
+        {"content": build_prompt(possible_categories, fields),
+         "images": [base64.b64encode(img_bytes).decode()]},
+        fields,
+    )
+
+
+def extract_fields_from_text(text, possible_categories, fields=FIELD_NAMES):
+    # Extracts the requested fields from the OCR text with the text model. Long pages are cut short
+    text = text[:EXTRACTION_TEXT_MAX_CHARS]
+    return run_extraction(
+        OLLAMA_TEXT_MODEL or get_secret("OLLAMA_MODEL"),
+        "text",
+        text.encode(),
+        {"content": build_prompt(possible_categories, fields, text=text)},
+        fields,
+    )
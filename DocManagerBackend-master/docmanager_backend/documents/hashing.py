@@ -0,0 +1,18 @@
+import hashlib
+
+# Files are hashed in chunks so large scans are never loaded into memory at once
+CHUNK_SIZE = 1024 * 1024
+
+
+def file_sha256(file):
+    # Accepts either a path or a Django File/UploadedFile
+    digest = hashlib.sha256()
+    if isinstance(file, str):
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+    else:
+        # chunks() rewinds the file first, so it can still be saved afterwards
+        for chunk in file.chunks(chunk_size=CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,40 @@
+from io import BytesIO
+from PIL import Image, ImageOps
+from config.settings import (
+    LLM_IMAGE_CROP,
+    LLM_IMAGE_GRAYSCALE,
+    LLM_IMAGE_MAX_SIZE,
+    LLM_IMAGE_FORMAT,
+    LLM_IMAGE_QUALITY
+)
+
+
+def llm_image_variant():
+    # Short description of the current image settings, used in logs to compare variants
+    return f"{LLM_IMAGE_FORMAT.lower()}-q{LLM_IMAGE_QUALITY}-{LLM_IMAGE_MAX_SIZE}px-crop{LLM_IMAGE_CROP}{'-gray' if LLM_IMAGE_GRAYSCALE else ''}"
+
+
+def prepare_llm_image(img_bytes):
+    # Shrinks a rendered page before it is sent to the vision model
+    img = Image.open(BytesIO(img_bytes))
+
+    # The document type, sender, subject and date are usually in the header
+    if LLM_IMAGE_CROP < 1:
+        img = img.crop((0, 0, img.width, max(1, int(img.height * LLM_IMAGE_CROP))))
+
+    if LLM_IMAGE_GRAYSCALE:
+        img = ImageOps.grayscale(img)
+    elif img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
+
+    # Only scale down, never up
+    if LLM_IMAGE_MAX_SIZE:
+        img.thumbnail((LLM_IMAGE_MAX_SIZE, LLM_IMAGE_MAX_SIZE))
+
+    buffer = BytesIO()
+    if LLM_IMAGE_FORMAT.upper() == "PNG":
+        img.save(buffer, format="PNG", optimize=True)
+    else:
+        img.save(buffer, format=LLM_IMAGE_FORMAT.upper(),
+                 quality=LLM_IMAGE_QUALITY)
+    return buffer.getvalue()
@@ -0,0 +1,179 @@
+import json
+import logging
+import os
+import threading
+import time
+from config.settings import METRICS_DIR, METRICS_INTERVAL
+
+# In-process counters, gauges and histograms, written out in the Prometheus text format.
+# Each process keeps its own numbers. The watcher and every web server process write them to METRICS_DIR, where they
+# can be picked up by node_exporter's textfile collector, and the metrics endpoint combines them
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds for timing histograms
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Web server files not written for this many intervals are from worker processes that have stopped
+STALE_INTERVALS = 4
+
+DESCRIPTIONS = {
+    "ingestion_stage_seconds": "Time spent in each stage of processing a scanned document",
+    "ingestion_documents_total": "Scanned documents processed by the watcher, by outcome",
+    "ingestion_jobs_total": "Ingestion job attempts, by outcome",
+    "ingestion_ollama_errors_total": "Ollama extractions that failed and fell back to default values",
+    "ingestion_queue_depth": "Ingestion jobs waiting for a worker in the watcher",
+    "ingestion_in_flight": "Ingestion jobs queued in or being processed by the watcher",
+    "ingestion_settling_files": "Files waiting for their size and modification time to stop changing",
+    "ingestion_queued_jobs": "Ingestion jobs queued in the database, including retries that are not due yet",
+    "document_saves_total": "Document saves seen by post_save, by whether the document was created",
+    "document_ocr_seconds": "Time spent reading every page of an uploaded document",
+    "document_ocr_total": "Background OCR runs for uploaded documents, by outcome",
+}
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Keyed by (name, labels), where labels is a sorted tuple of (name, value) pairs
+        self.counters = {}
+        self.gauges = {}
+        # Values are [count per bucket, sum, count]
+        self.histograms = {}
+
+    def inc(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.gauges[key] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.setdefault(
+                key, [[0] * len(BUCKETS), 0, 0])
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def render(self):
+        lines = []
+        described = set()
+
+        def describe(name, metric_type):
+            if name not in described:
+                described.add(name)
+                if name in DESCRIPTIONS:
+                    lines.append(f"# HELP {name} {DESCRIPTIONS[name]}")
+                lines.append(f"# TYPE {name} {metric_type}")
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                describe(name, "counter")
+                lines.append(f"{name}{format_labels(labels)} {value}")
+            for (name, labels), value in sorted(self.gauges.items()):
+                describe(name, "gauge")
+                lines.append(f"{name}{format_labels(labels)} {value}")
+            for (name, labels), (buckets, total, count) in sorted(self.histograms.items()):
+                describe(name, "histogram")
+                for bound, bucket_count in zip(BUCKETS, buckets):
+                    lines.append(
+                        f"{name}_bucket{format_labels((*labels, ('le', bound)))} {bucket_count}")
+                lines.append(
+                    f"{name}_bucket{format_labels((*labels, ('le', '+Inf')))} {count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {total}")
+                lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "counters": [[name, labels, value] for (name, labels), value in self.counters.items()],
+                "gauges": [[name, labels, value] for (name, labels), value in self.gauges.items()],
+                "histograms": [[name, labels, value] for (name, labels), value in self.histograms.items()],
+            }
+
+    def merge(self, snapshot, **extra_labels):
+        # Copies in the numbers from a snapshot, with extra labels so numbers from different processes stay apart
+        with self.lock:
+            for kind in ("counters", "gauges", "histograms"):
+                for name, labels, value in snapshot[kind]:
+                    key = (name, tuple(
+                        sorted({**dict(map(tuple, labels)), **extra_labels}.items())))
+                    getattr(self, kind)[key] = value
+
+    def write(self, name):
+        # Writes name.prom for node_exporter and name.json for the metrics endpoint. The .prom file labels every number
+        # with the process name so files from different processes do not clash.
+        # Each file is written to a temporary file first so readers never see a partial file
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        labelled = Metrics()
+        labelled.merge(self.snapshot(), process=name)
+        for extension, content in (("prom", labelled.render()), ("json", json.dumps(self.snapshot()))):
+            path = os.path.join(METRICS_DIR, f"{name}.{extension}")
+            with open(f"{path}.tmp", "w") as f:
+                f.write(content)
+            os.replace(f"{path}.tmp", path)
+
+    def start_writer(self, name):
+        # Writes the metrics every METRICS_INTERVAL seconds from a background thread, for processes without a loop of their own
+        def write_periodically():
+            while True:
+                time.sleep(METRICS_INTERVAL)
+                try:
+                    self.write(name)
+                except Exception as e:
+                    logger.error(f"Error writing metrics: {str(e)}")
+
+        threading.Thread(target=write_periodically,
+                         name="Metrics-Writer", daemon=True).start()
+
+
+metrics = Metrics()
+
+
+def web_process():
+    # Every web server worker keeps its own numbers, so each one writes them under its own name
+    return f"web-{os.getpid()}"
+
+
+def log_event(event, **fields):
+    # One JSON object per line so the records can be parsed by log tooling
+    logger.info(json.dumps({"event": event, **fields}, default=str))
+
+
+def collect(process):
+    # Combines this process' metrics with the ones other processes, such as the watcher and the other web server
+    # workers, have written to METRICS_DIR. Files of web server workers that have stopped are removed
+    combined = Metrics()
+    combined.merge(metrics.snapshot(), process=process)
+    if os.path.isdir(METRICS_DIR):
+        stale_before = time.time() - STALE_INTERVALS * METRICS_INTERVAL
+        for filename in sorted(os.listdir(METRICS_DIR)):
+            name, extension = os.path.splitext(filename)
+            if extension != ".json" or name == process:
+                continue
+            path = os.path.join(METRICS_DIR, filename)
+            try:
+                if name.startswith("web-") and os.path.getmtime(path) < stale_before:
+                    os.remove(path)
+                    os.remove(os.path.join(METRICS_DIR, f"{name}.prom"))
+                    continue
+                with open(path) as f:
+                    combined.merge(json.load(f), process=name)
+            except FileNotFoundError:
+                # Removed by another worker in the meantime
+                continue
+    return combined
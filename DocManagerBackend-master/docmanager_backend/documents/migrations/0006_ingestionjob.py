@@ -0,0 +1,83 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0005_document_document_month_document_document_year_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IngestionJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("file_path", models.CharField(max_length=512)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "Queued"),
+                            ("rendering", "Rendering"),
+                            ("ocr", "OCR"),
+                            ("extracting", "Extracting"),
+                            ("stored", "Stored"),
+                            ("failed", "Failed"),
+                        ],
+                        default="queued",
+                        max_length=16,
+                    ),
+                ),
+                ("attempts", models.IntegerField(default=0)),
+                ("last_error", models.TextField(blank=True, null=True)),
+                (
+                    "date_created",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, editable=False
+                    ),
+                ),
+                (
+                    "date_updated",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("date_started", models.DateTimeField(blank=True, null=True)),
+                ("date_finished", models.DateTimeField(blank=True, null=True)),
+                (
+                    "next_attempt",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                (
+                    "document",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="documents.document",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt"],
+                        name="documents_i_status_5ade08_idx",
+                    ),
+                    models.Index(
+                        fields=["file_path"], name="documents_i_file_pa_5423cc_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
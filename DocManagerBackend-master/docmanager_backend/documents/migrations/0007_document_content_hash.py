@@ -0,0 +1,49 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:01
+
+import os
+from django.conf import settings
+from django.db import migrations, models
+from documents.hashing import file_sha256
+
+
+def backfill_content_hash(apps, schema_editor):
+    # Hash existing files so they are covered by duplicate detection.
+    # Missing files and later copies of an already hashed file are left without a hash
+    Document = apps.get_model("documents", "Document")
+    seen = set()
+    for DOCUMENT in Document.objects.all().only("id", "file").order_by("id").iterator():
+        file_path = os.path.join(settings.MEDIA_ROOT, DOCUMENT.file.name)
+        if not DOCUMENT.file.name or not os.path.isfile(file_path):
+            continue
+        content_hash = file_sha256(file_path)
+        if content_hash in seen:
+            continue
+        seen.add(content_hash)
+        Document.objects.filter(id=DOCUMENT.id).update(
+            content_hash=content_hash)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0006_ingestionjob"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True
+            ),
+        ),
+        migrations.RunPython(backfill_content_hash,
+                             migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="document",
+            name="content_hash",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True, unique=True
+            ),
+        ),
+    ]
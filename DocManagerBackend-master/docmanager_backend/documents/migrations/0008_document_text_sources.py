@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0007_document_content_hash"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="text_sources",
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
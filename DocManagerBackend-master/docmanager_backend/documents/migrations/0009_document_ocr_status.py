@@ -0,0 +1,40 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:02
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_done(apps, schema_editor):
+    # Documents from before background OCR were already read when they were saved
+    Document = apps.get_model("documents", "Document")
+    Document.objects.update(ocr_status="done", ocr_pages_done=F("number_pages"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0008_document_text_sources"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="ocr_pages_done",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="document",
+            name="ocr_status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("processing", "Processing"),
+                    ("done", "Done"),
+                    ("failed", "Failed"),
+                ],
+                default="pending",
+                max_length=16,
+            ),
+        ),
+        migrations.RunPython(mark_existing_done, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:09
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0009_document_ocr_status"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ExtractionRun",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "mode",
+                    models.CharField(
+                        choices=[("vision", "Vision"), ("text", "Text")], max_length=16
+                    ),
+                ),
+                ("model", models.CharField(max_length=128)),
+                ("fields", models.JSONField(default=list)),
+                ("elapsed", models.FloatField()),
+                ("cached", models.BooleanField(default=False)),
+                ("agreement", models.JSONField(blank=True, null=True)),
+                (
+                    "date_created",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, editable=False
+                    ),
+                ),
+                (
+                    "document",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="documents.document",
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:11
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_document_types(apps, schema_editor):
+    # Count the types of existing documents once. Signals keep the counts up to date from here on
+    Document = apps.get_model("documents", "Document")
+    DocumentType = apps.get_model("documents", "DocumentType")
+    DocumentType.objects.bulk_create([
+        DocumentType(name=row["document_type"], count=row["count"])
+        for row in Document.objects.values("document_type").annotate(count=Count("id"))
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0010_extractionrun"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DocumentType",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=128, unique=True)),
+                ("count", models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(populate_document_types,
+                             migrations.RunPython.noop),
+    ]
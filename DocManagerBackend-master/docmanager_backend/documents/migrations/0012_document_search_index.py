@@ -0,0 +1,32 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0011_documenttype"),
+    ]
+
+    # Full-text index used by documents.search. Existing documents are indexed once here, signals keep it in sync after
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                """
+                CREATE VIRTUAL TABLE documents_document_fts USING fts5(
+                    name, subject, sent_from, document_type, document_month, document_year, ocr_metadata,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3'
+                )
+                """,
+                """
+                INSERT INTO documents_document_fts (
+                    rowid, name, subject, sent_from, document_type, document_month, document_year, ocr_metadata
+                )
+                SELECT id, name, IFNULL(subject, ''), IFNULL(sent_from, ''), document_type,
+                       IFNULL(document_month, ''), IFNULL(document_year, ''), IFNULL(ocr_metadata, '')
+                FROM documents_document
+                """,
+            ],
+            reverse_sql="DROP TABLE documents_document_fts",
+        ),
+    ]
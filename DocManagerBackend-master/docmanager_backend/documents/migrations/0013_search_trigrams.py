@@ -0,0 +1,47 @@
+from django.db import migrations
+
+
+def populate_trigrams(apps, schema_editor):
+    # Collect the words already in the search index once. documents.search keeps them up to date from here on
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT term FROM documents_document_fts_vocab WHERE length(term) BETWEEN 3 AND 40")
+        terms = [term for term, in cursor.fetchall()]
+        cursor.executemany(
+            "INSERT INTO documents_search_term (term) VALUES (%s)", [(term,) for term in terms])
+        for term in terms:
+            padded = f" {term} "
+            cursor.executemany("INSERT OR IGNORE INTO documents_search_trigram (trigram, term) VALUES (%s, %s)", [
+                (padded[i:i + 3], term) for i in range(len(padded) - 2)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0012_document_search_index"),
+    ]
+
+    # Trigrams of every indexed word, used by documents.search to match misspelled words
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE VIRTUAL TABLE documents_document_fts_vocab USING fts5vocab(documents_document_fts, 'row')",
+                "CREATE TABLE documents_search_term (term TEXT PRIMARY KEY) WITHOUT ROWID",
+                """
+                CREATE TABLE documents_search_trigram (
+                    trigram TEXT NOT NULL,
+                    term TEXT NOT NULL,
+                    PRIMARY KEY (trigram, term)
+                ) WITHOUT ROWID
+                """,
+                # Used when words are removed
+                "CREATE INDEX documents_search_trigram_term ON documents_search_trigram (term)",
+            ],
+            reverse_sql=[
+                "DROP TABLE documents_search_trigram",
+                "DROP TABLE documents_search_term",
+                "DROP TABLE documents_document_fts_vocab",
+            ],
+        ),
+        migrations.RunPython(populate_trigrams, migrations.RunPython.noop),
+    ]
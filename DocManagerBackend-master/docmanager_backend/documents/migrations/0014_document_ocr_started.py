@@ -0,0 +1,18 @@
+# Generated by Django 5.1.3 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("documents", "0013_search_trigrams"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="ocr_started",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
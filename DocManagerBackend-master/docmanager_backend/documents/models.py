@@ -1,6 +1,10 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F
 from django.utils.timezone import now
+from django.core.cache import cache
+from datetime import timedelta
 import uuid
+from config.settings import DOCUMENT_TYPES_CACHE_TTL
 
 
 class Document(models.Model):
@@ -23,6 +27,26 @@ class Document(models.Model):
     )
     number_pages = models.IntegerField(null=False, blank=False)
     ocr_metadata = models.TextField(null=True, blank=True)
+    # Where the text of each page came from. "text" for the PDF text layer, "ocr" for Tesseract
+    text_sources = models.JSONField(default=list, blank=True)
+
+    OCR_STATUS_CHOICES = (
+        ("pending", "Pending"),
+        ("processing", "Processing"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+    ocr_status = models.CharField(
+        max_length=16, choices=OCR_STATUS_CHOICES, default="pending"
+    )
+    # Number of pages read so far. Used to report OCR progress
+    ocr_pages_done = models.IntegerField(default=0, null=False, blank=False)
+    # When OCR of the document last started. Used to find documents whose OCR stopped with the process running it
+    ocr_started = models.DateTimeField(null=True, blank=True, editable=False)
+    # SHA-256 of the file contents, used to reject duplicate uploads and scans
+    content_hash = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False
+    )
 
     def upload_to(instance, filename):
         _, extension = filename.rsplit(".", 1)
@@ -34,3 +58,184 @@ class Document(models.Model):
 
     def __str__(self):
         return f"{self.name} ({self.document_type})"
+
+
+class IngestionJob(models.Model):
+    # Tracks a scanned PDF through the watcher so interrupted work can be resumed
+    file_path = models.CharField(max_length=512)
+
+    STATUS_CHOICES = (
+        ("queued", "Queued"),
+        ("rendering", "Rendering"),
+        ("ocr", "OCR"),
+        ("extracting", "Extracting"),
+        ("stored", "Stored"),
+        ("failed", "Failed"),
+    )
+    # Jobs in these states are currently held by a worker
+    ACTIVE_STATUSES = ("rendering", "ocr", "extracting")
+
+    status = models.CharField(
+        max_length=16, choices=STATUS_CHOICES, default="queued")
+    attempts = models.IntegerField(default=0, null=False, blank=False)
+    last_error = models.TextField(null=True, blank=True)
+    document = models.ForeignKey(
+        "documents.Document", on_delete=models.SET_NULL, null=True, blank=True)
+
+    date_created = models.DateTimeField(default=now, editable=False)
+    date_updated = models.DateTimeField(default=now)
+    date_started = models.DateTimeField(null=True, blank=True)
+    date_finished = models.DateTimeField(null=True, blank=True)
+    # Queued jobs are not picked up before this time. Used for retry backoff
+    next_attempt = models.DateTimeField(default=now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "next_attempt"]),
+            models.Index(fields=["file_path"]),
+        ]
+
+    @classmethod
+    def enqueue(cls, file_path):
+        # Reuse the pending job for this file if there is one
+        job = cls.objects.filter(file_path=file_path).exclude(
+            status__in=["stored", "failed"]).first()
+        if not job:
+            job = cls.objects.create(file_path=file_path)
+        return job
+
+    @classmethod
+    def claim(cls, job_id):
+        # Atomically moves a queued job to rendering. Returns None if another worker got to it first
+        claimed = cls.objects.filter(id=job_id, status="queued").update(
+            status="rendering",
+            attempts=F("attempts") + 1,
+            date_started=now(),
+            date_updated=now(),
+        )
+        if not claimed:
+            return None
+        return cls.objects.get(id=job_id)
+
+    @classmethod
+    def requeue_interrupted(cls):
+        # Jobs left in an active state belonged to a watcher that stopped midway
+        return cls.objects.filter(status__in=cls.ACTIVE_STATUSES).update(
+            status="queued", next_attempt=now(), date_updated=now())
+
+    def set_status(self, status):
+        self.status = status
+        self.date_updated = now()
+        self.save(update_fields=["status", "date_updated"])
+
+    def mark_stored(self, document):
+        self.status = "stored"
+        self.document = document
+        self.last_error = None
+        self.date_updated = self.date_finished = now()
+        self.save(update_fields=["status", "document",
+                  "last_error", "date_updated", "date_finished"])
+
+    def mark_failed(self, error, max_attempts, backoff):
+        # Requeues the job with exponential backoff until it runs out of attempts
+        self.last_error = str(error)
+        self.date_updated = now()
+        if self.attempts < max_attempts:
+            self.status = "queued"
+            self.next_attempt = now() + timedelta(seconds=backoff * 2 ** (self.attempts - 1))
+        else:
+            self.status = "failed"
+            self.date_finished = self.date_updated
+        self.save(update_fields=["status", "last_error",
+                  "date_updated", "date_finished", "next_attempt"])
+        return self.status == "queued"
+
+    def __str__(self):
+        return f"{self.file_path} ({self.status})"
+
+
+class ExtractionRun(models.Model):
+    # One Ollama extraction made by the watcher. Used to compare the latency and accuracy of each extraction mode
+    MODE_CHOICES = (
+        ("vision", "Vision"),
+        ("text", "Text"),
+    )
+
+    mode = models.CharField(max_length=16, choices=MODE_CHOICES)
+    model = models.CharField(max_length=128)
+    document = models.ForeignKey(
+        "documents.Document", on_delete=models.SET_NULL, null=True, blank=True)
+    fields = models.JSONField(default=list)
+    elapsed = models.FloatField()
+    cached = models.BooleanField(default=False)
+    # {field: True/False} for whether the text result matched the vision result. Only set in compare mode
+    agreement = models.JSONField(null=True, blank=True)
+
+    date_created = models.DateTimeField(default=now, editable=False)
+
+    @classmethod
+    def summary(cls):
+        # Average latency per mode, and how often the text model agreed with the vision model for each field
+        summary = {}
+        for mode, _ in cls.MODE_CHOICES:
+            runs = cls.objects.filter(mode=mode, cached=False)
+            summary[mode] = {
+                "runs": runs.count(),
+                "average_elapsed": runs.aggregate(average=models.Avg("elapsed"))["average"],
+            }
+
+        agreement = {}
+        for fields in cls.objects.filter(agreement__isnull=False).values_list("agreement", flat=True):
+            for name, agreed in fields.items():
+                counts = agreement.setdefault(name, [0, 0])
+                counts[0] += int(agreed)
+                counts[1] += 1
+        summary["agreement"] = {
+            name: round(agreed / total, 4) for name, (agreed, total) in agreement.items()}
+        return summary
+
+    def __str__(self):
+        return f"{self.mode} extraction ({self.elapsed:.2f}s)"
+
+
+class DocumentType(models.Model):
+    # Distinct document types and how many documents use each. Kept up to date by signals so the documents table is never scanned for them
+    name = models.CharField(max_length=128, unique=True)
+    count = models.IntegerField(default=0)
+
+    CACHE_KEY = "document_types"
+
+    @classmethod
+    def adjust(cls, name, amount):
+        # Adds to the count of a type, creating it if needed. Types with no documents left are removed.
+        # Every step runs in one transaction, so a concurrent adjust cannot delete the row between them and lose the count
+        with transaction.atomic():
+            updated = cls.objects.filter(name=name).update(
+                count=F("count") + amount)
+            if not updated and amount > 0:
+                try:
+                    with transaction.atomic():
+                        cls.objects.create(name=name, count=amount)
+                except IntegrityError:
+                    # Created by another process in the meantime
+                    cls.objects.filter(name=name).update(
+                        count=F("count") + amount)
+            cls.objects.filter(name=name, count__lte=0).delete()
+            transaction.on_commit(lambda: cache.delete(cls.CACHE_KEY))
+
+    @classmethod
+    def cached(cls):
+        # Cached per process. Other processes see changes once their copy expires
+        types = cache.get(cls.CACHE_KEY)
+        if types is None:
+            types = list(cls.objects.order_by(
+                "-count", "name").values("name", "count"))
+            cache.set(cls.CACHE_KEY, types, DOCUMENT_TYPES_CACHE_TTL)
+        return types
+
+    @classmethod
+    def names(cls):
+        return [document_type["name"] for document_type in cls.cached()]
+
+    def __str__(self):
+        return f"{self.name} ({self.count})"
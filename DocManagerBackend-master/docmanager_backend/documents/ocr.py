@@ -0,0 +1,152 @@
+from io import BytesIO
+from concurrent.futures import as_completed
+from functools import cache
+import hashlib
+import math
+import fitz
+import pytesseract
+from PIL import Image
+from config.settings import (
+    OCR_MIN_TEXT_LENGTH,
+    OCR_MIN_TEXT_QUALITY,
+    OCR_LANGUAGE,
+    OCR_CACHE_PATH,
+    OCR_CACHE_MAX_ENTRIES,
+    OCR_CACHE_MAX_MB
+)
+from .cache import DiskCache
+
+# These helpers are run inside worker processes, so this module must not import Django models
+
+# Zoom used when rendering pages for OCR
+RENDER_ZOOM = 1.2
+RENDER_MATRIX = fitz.Matrix(RENDER_ZOOM, RENDER_ZOOM)
+
+
+@cache
+def get_ocr_cache():
+    # One cache per process. Disabled when OCR_CACHE_MAX_ENTRIES is 0
+    if not OCR_CACHE_MAX_ENTRIES:
+        return None
+    return DiskCache(
+        OCR_CACHE_PATH,
+        max_entries=OCR_CACHE_MAX_ENTRIES,
+        max_bytes=OCR_CACHE_MAX_MB * 1024 * 1024,
+    )
+
+
+@cache
+def tesseract_version():
+    return str(pytesseract.get_tesseract_version())
+
+
+def ocr_cache_key(img_bytes):
+    # Same rendered page, OCR engine, language and resolution always gives the same text
+    digest = hashlib.sha256(img_bytes).hexdigest()
+    return f"tesseract-{tesseract_version()}:{OCR_LANGUAGE}:{RENDER_ZOOM}:{digest}"
+
+
+def is_text_usable(text):
+    # Decides if a page's embedded text layer can be used instead of OCR.
+    # Scanned PDFs usually have no text layer, or one filled with stray symbols
+    if len(text) < OCR_MIN_TEXT_LENGTH:
+        return False
+    readable = sum(1 for char in text if char.isalnum() or char.isspace())
+    return readable / len(text) >= OCR_MIN_TEXT_QUALITY
+
+
+def page_text(page, timeout=0):
+    # Returns the text of a page and where it came from ("text" for the PDF text layer, "ocr" for Tesseract).
+    # Pages where Tesseract runs past the timeout are returned empty with "failed" as the source
+    text = page.get_text().strip()
+    if is_text_usable(text):
+        return text, "text"
+
+    pix = page.get_pixmap(matrix=RENDER_MATRIX)
+    try:
+        return ocr_image(pix.tobytes(), timeout=timeout), "ocr"
+    except RuntimeError:
+        return "", "failed"
+
+
+def read_page_range(file_path, start, stop, timeout=0):
+    # Each worker opens the PDF itself so only the resulting text is sent back between processes
+    with fitz.open(file_path) as doc:
+        return [page_text(doc[i], timeout=timeout) for i in range(start, stop)]
+
+
+def read_document(file_path, executor, parallelism, pages_per_task, page_timeout=0, on_progress=None):
+    # Reads every page of a PDF by handing page ranges to a process pool.
+    # Returns the text of each page and its source, in page order
+    with fitz.open(file_path) as doc:
+        num_pages = len(doc)
+    if not num_pages:
+        return [], []
+
+    # Split pages evenly across the pool, in ranges small enough to report progress
+    range_size = max(1, min(pages_per_task, math.ceil(num_pages / parallelism)))
+    futures = {
+        executor.submit(read_page_range, file_path, start, min(start + range_size, num_pages), page_timeout): start
+        for start in range(0, num_pages, range_size)
+    }
+
+    # Guard against a worker hanging outside of Tesseract, e.g. while rendering
+    total_timeout = page_timeout * range_size * len(futures) if page_timeout else None
+
+    pages = [None] * num_pages
+    pages_done = 0
+    for future in as_completed(futures, timeout=total_timeout):
+        start = futures[future]
+        for offset, result in enumerate(future.result()):
+            pages[start + offset] = result
+        pages_done += len(future.result())
+        if on_progress:
+            on_progress(pages_done)
+
+    texts = [text for text, _ in pages]
+    text_sources = [source for _, source in pages]
+    return texts, text_sources
+
+
+def render_first_page(file_path):
+    # Render the first page of a PDF to PNG bytes, along with its embedded text layer
+    with fitz.open(file_path) as doc:
+        num_pages = len(doc)
+
+        page = doc[0]
+        pix = page.get_pixmap(matrix=RENDER_MATRIX)
+
+        # Convert pixmap to bytes
+        img_bytes = pix.tobytes()
+        text = page.get_text().strip()
+
+    return num_pages, img_bytes, text
+
+
+def ocr_image(img_bytes, timeout=0):
+    try:
+        return read_image_text(img_bytes, timeout=timeout)
+    except pytesseract.TesseractNotFoundError as e:
+        # TesseractNotFoundError cannot be pickled, and an error that cannot be sent back from a worker breaks the whole process pool
+        raise OSError(str(e)) from None
+
+
+def read_image_text(img_bytes, timeout=0):
+    # Pages that have been read before are served from the OCR cache
+    ocr_cache = get_ocr_cache()
+    if ocr_cache:
+        key = ocr_cache_key(img_bytes)
+        text = ocr_cache.get(key)
+        if text is not None:
+            return text
+
+    # Create a PIL Image object from the bytes
+    img = Image.open(BytesIO(img_bytes))
+
+    # Perform OCR. Raises RuntimeError if Tesseract runs past the timeout (0 disables it)
+    text = pytesseract.image_to_string(
+        img, lang=OCR_LANGUAGE, timeout=timeout).strip()
+
+    if ocr_cache:
+        ocr_cache.set(key, text)
+    return text
@@ -0,0 +1,94 @@
+import re
+from datetime import datetime
+
+# Reads the document type, sender, subject and date from OCR text using the layout most memos and orders follow.
+# Each field comes with a confidence between 0 and 1 so uncertain fields can be passed on to the LLM
+
+# Only the top of the page is searched for headings
+HEADER_LINES = 15
+
+DOCUMENT_TYPE_PATTERNS = (
+    (re.compile(r"\bMEMO\s?RAND[UV][MN]\b", re.IGNORECASE), "Memorandum"),
+    (re.compile(r"\bSPECIAL\s+ORDER\b", re.IGNORECASE), "Special Order"),
+    (re.compile(r"\bDOCUMENTED\s+PROCEDURES?\s+MANUAL\b",
+     re.IGNORECASE), "Documented Procedures Manual"),
+)
+
+FROM_PATTERN = re.compile(r"^\s*FROM\s*[:;]\s*(?P<value>.+)$",
+                          re.IGNORECASE | re.MULTILINE)
+SUBJECT_PATTERN = re.compile(
+    r"^\s*(?:SUBJECT|SUBJ|RE)\s*[:;]\s*(?P<value>.+)$", re.IGNORECASE | re.MULTILINE)
+DATE_LABEL_PATTERN = re.compile(
+    r"^\s*DATE\s*[:;]\s*(?P<value>.+)$", re.IGNORECASE | re.MULTILINE)
+DATE_PATTERN = re.compile(
+    r"\b(?:January|February|March|April|May|June|July|August|September|October|November|December)\s+\d{1,2},?\s+\d{4}\b"
+    r"|\b\d{1,2}\s+(?:January|February|March|April|May|June|July|August|September|October|November|December),?\s+\d{4}\b"
+    r"|\b\d{1,2}/\d{1,2}/\d{4}\b|\b\d{4}-\d{2}-\d{2}\b",
+    re.IGNORECASE,
+)
+DATE_FORMATS = ("%B %d, %Y", "%B %d %Y", "%d %B %Y", "%d %B, %Y",
+                "%b %d, %Y", "%b %d %Y", "%m/%d/%Y", "%Y-%m-%d")
+
+
+def clean_value(value):
+    # Collapse whitespace and strip stray punctuation left by OCR
+    return re.sub(r"\s+", " ", value).strip(" .,;:-_|")
+
+
+def parse_date(value):
+    value = clean_value(value)
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def extract_document_type(text):
+    for line in text.splitlines()[:HEADER_LINES]:
+        line = line.strip()
+        for pattern, document_type in DOCUMENT_TYPE_PATTERNS:
+            match = pattern.search(line)
+            if match:
+                # A heading that starts a line (e.g. "SPECIAL ORDER No. 12") is more reliable than a mention in a sentence
+                confidence = 0.95 if match.start() <= 2 else 0.6
+                return document_type, confidence
+    return None, 0
+
+
+def extract_labelled(pattern, text):
+    match = pattern.search(text)
+    if not match:
+        return None, 0
+    value = clean_value(match.group("value"))
+    # Very short or very long values are usually OCR noise or a merged paragraph
+    if not 3 <= len(value) <= 128:
+        return value or None, 0.3
+    return value, 0.9
+
+
+def extract_date(text):
+    match = DATE_LABEL_PATTERN.search(text)
+    if match:
+        document_date = parse_date(match.group("value"))
+        if document_date:
+            return document_date, 0.9
+
+    # Fall back to the first date-like string on the page
+    match = DATE_PATTERN.search(text)
+    if match:
+        document_date = parse_date(match.group(0))
+        if document_date:
+            return document_date, 0.6
+    return None, 0
+
+
+def extract_rule_fields(text):
+    # Returns {field: (value, confidence)} using the same field names as the extraction schema
+    return {
+        "category": extract_document_type(text),
+        "sent_from": extract_labelled(FROM_PATTERN, text),
+        "subject": extract_labelled(SUBJECT_PATTERN, text),
+        "document_date": extract_date(text),
+    }
@@ -0,0 +1,241 @@
+import math
+import re
+import unicodedata
+from django.db import connection
+from django.utils.html import escape
+from config.settings import SEARCH_FUZZY, SEARCH_TRIGRAM_THRESHOLD, SEARCH_FUZZY_MAX_TERMS
+
+# Full-text index over documents, kept in an SQLite FTS5 table (created in migration 0012).
+# Each row uses the document id as its rowid. Signals keep it in sync with saves and deletes,
+# code that writes with update() or bulk_create() calls index_documents itself
+
+TABLE = "documents_document_fts"
+# Indexed columns, in table order
+COLUMNS = ("name", "subject", "sent_from", "document_type",
+           "document_month", "document_year", "ocr_metadata")
+# bm25 weight per column, so a match in the name or subject ranks above one buried in the OCR text
+WEIGHTS = (10.0, 8.0, 5.0, 3.0, 1.0, 1.0, 1.0)
+
+# Every distinct indexed word and its trigrams (created in migration 0013), used to find words that look like a
+# misspelled search word. The words are updated with the index, and words no document uses anymore are removed
+TERM_TABLE = "documents_search_term"
+TRIGRAM_TABLE = "documents_search_trigram"
+# fts5vocab table over the index, used to check whether any document still has a word
+VOCAB_TABLE = "documents_document_fts_vocab"
+# Shorter words have too few trigrams to compare, longer ones are usually OCR noise
+MIN_TERM_LENGTH = 3
+MAX_TERM_LENGTH = 40
+# Number of values per IN (...) query
+CHUNK_SIZE = 500
+
+# List responses carry a short snippet of each document's text instead of all of it. Search results get the words
+# around the matches, with the matches marked, other lists get the start of the OCR text
+SNIPPET_TOKENS = 24
+PREVIEW_LENGTH = 200
+# Placed around matches by snippet(), then swapped for <mark> tags once the rest of the text is escaped
+MATCH_START = "\x02"
+MATCH_END = "\x03"
+
+
+def normalize(text):
+    # Lowercases and strips accents the way the index tokenizer does
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def terms_of(texts):
+    terms = set()
+    for text in texts:
+        terms.update(term for term in re.findall(r"[^\W_]+", normalize(text))
+                     if MIN_TERM_LENGTH <= len(term) <= MAX_TERM_LENGTH)
+    return terms
+
+
+def trigrams(term):
+    # Padded so the start and end of a word count
+    padded = f" {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def chunks(values):
+    values = list(values)
+    for i in range(0, len(values), CHUNK_SIZE):
+        yield values[i:i + CHUNK_SIZE]
+
+
+def indexed_terms(cursor, document_ids):
+    # Words of the documents as they are currently indexed
+    texts = []
+    for chunk in chunks(document_ids):
+        cursor.execute(
+            f"SELECT {', '.join(COLUMNS)} FROM {TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        texts.extend(text for row in cursor.fetchall() for text in row)
+    return terms_of(texts)
+
+
+def add_terms(cursor, terms):
+    for chunk in chunks(terms):
+        cursor.execute(
+            f"SELECT term FROM {TERM_TABLE} WHERE term IN ({', '.join(['%s'] * len(chunk))})", chunk)
+        new_terms = set(chunk) - {term for term, in cursor.fetchall()}
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {TERM_TABLE} (term) VALUES (%s)", [(term,) for term in new_terms])
+        cursor.executemany(f"INSERT OR IGNORE INTO {TRIGRAM_TABLE} (trigram, term) VALUES (%s, %s)", [
+            (trigram, term) for term in new_terms for trigram in trigrams(term)])
+
+
+def prune_terms(cursor, terms):
+    # Removes the words that no indexed document has anymore
+    for chunk in chunks(terms):
+        placeholders = ", ".join(["%s"] * len(chunk))
+        cursor.execute(
+            f"SELECT term FROM {VOCAB_TABLE} WHERE term IN ({placeholders})", chunk)
+        unused = list(set(chunk) - {term for term, in cursor.fetchall()})
+        if unused:
+            placeholders = ", ".join(["%s"] * len(unused))
+            cursor.execute(
+                f"DELETE FROM {TRIGRAM_TABLE} WHERE term IN ({placeholders})", unused)
+            cursor.execute(
+                f"DELETE FROM {TERM_TABLE} WHERE term IN ({placeholders})", unused)
+
+
+def index_documents(documents):
+    rows = [(DOCUMENT.id, *(str(getattr(DOCUMENT, column) or "") for column in COLUMNS))
+            for DOCUMENT in documents]
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        old_terms = indexed_terms(cursor, [row[0] for row in rows])
+        cursor.executemany(
+            f"DELETE FROM {TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {TABLE} (rowid, {', '.join(COLUMNS)}) VALUES ({', '.join(['%s'] * (len(COLUMNS) + 1))})", rows)
+
+        new_terms = terms_of(text for row in rows for text in row[1:])
+        add_terms(cursor, new_terms)
+        prune_terms(cursor, old_terms - new_terms)
+
+
+def remove_documents(document_ids):
+    with connection.cursor() as cursor:
+        old_terms = indexed_terms(cursor, document_ids)
+        cursor.executemany(
+            f"DELETE FROM {TABLE} WHERE rowid = %s", [(document_id,) for document_id in document_ids])
+        prune_terms(cursor, old_terms)
+
+
+def similar_terms(word, threshold=SEARCH_TRIGRAM_THRESHOLD, limit=SEARCH_FUZZY_MAX_TERMS):
+    # Indexed words whose trigrams overlap with the word's by at least threshold (Jaccard similarity), most alike first.
+    # A word can only reach the threshold if it shares at least threshold times the search word's trigrams,
+    # which lets the database discard most candidates
+    word = normalize(word)
+    if len(word) < MIN_TERM_LENGTH:
+        return []
+    word_trigrams = trigrams(word)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT term, COUNT(*) FROM {TRIGRAM_TABLE} WHERE trigram IN ({', '.join(['%s'] * len(word_trigrams))}) "
+            f"GROUP BY term HAVING COUNT(*) >= %s",
+            [*word_trigrams, math.ceil(threshold * len(word_trigrams))])
+        candidates = cursor.fetchall()
+
+    scored = []
+    for term, shared in candidates:
+        similarity = shared / (len(word_trigrams) + len(trigrams(term)) - shared)
+        if similarity >= threshold and term != word:
+            scored.append((similarity, term))
+    return [term for _, term in sorted(scored, reverse=True)[:limit]]
+
+
+# Field prefixes accepted in search queries, e.g. from:registrar year:2023, and the column each one searches
+PREFIXES = {
+    "name": "name",
+    "subject": "subject",
+    "from": "sent_from",
+    "type": "document_type",
+    "month": "document_month",
+    "year": "document_year",
+    "text": "ocr_metadata",
+}
+
+# An optional - to exclude, an optional prefix, then a quoted phrase (closing quote optional while typing) or a word
+TOKEN = re.compile(r'(-)?(?:(\w+):)?(?:"([^"]*)"?|(\S+))')
+
+
+def parse_query(query):
+    # Splits a search query into (exclude, column, words, phrase) clauses. column is None to search every column.
+    # Unknown prefixes, like the 10: in 10:30, are kept as part of the word
+    clauses = []
+    for exclude, prefix, phrase, word in TOKEN.findall(query):
+        column = PREFIXES.get(prefix.lower()) if prefix else None
+        if prefix and not column:
+            word = f"{prefix}:{phrase or word}"
+        words = re.findall(r"\w+", phrase or word)
+        if words:
+            clauses.append((bool(exclude), column, words, bool(phrase)))
+    return clauses
+
+
+def match_expression(query, fuzzy=SEARCH_FUZZY):
+    # Compiles a search query into one FTS5 MATCH expression. Every clause has to match. Words and unquoted terms
+    # are matched as prefixes, like the substring search this replaces, while quoted phrases have to match exactly.
+    # With fuzzy set, single words also match the indexed words most like them
+    included = []
+    excluded = []
+    for exclude, column, words, phrase in parse_query(query):
+        term = f'"{" ".join(words)}"' if phrase else f'"{" ".join(words)}"*'
+        if fuzzy and not phrase and not exclude and len(words) == 1:
+            alternatives = similar_terms(words[0])
+            if alternatives:
+                quoted = [f'"{alternative}"' for alternative in alternatives]
+                term = f"({' OR '.join([term, *quoted])})"
+        if column:
+            term = f"{column} : {term}"
+        (excluded if exclude else included).append(term)
+
+    # FTS5 can only exclude from a set of matches, so a query of only exclusions matches everything
+    if not included:
+        return None
+    return " AND ".join(included) + "".join(f" NOT {term}" for term in excluded)
+
+
+def search(queryset, expression):
+    # Filters a Document queryset to the documents matching a MATCH expression and adds search_rank. Lower ranks are
+    # better matches. The index is joined once, so SQLite reads the matches from it and ranks each of them once
+    table = queryset.model._meta.db_table
+    weights = ", ".join(str(weight) for weight in WEIGHTS)
+    return queryset.extra(
+        select={"search_rank": f"bm25({TABLE}, {weights})"},
+        tables=[TABLE],
+        where=[f"{TABLE}.rowid = {table}.id", f"{TABLE} MATCH %s"],
+        params=[expression],
+    )
+
+
+def load_snippets(documents, expression=None):
+    # Sets search_snippet on documents that are about to be returned. With a MATCH expression it is the text around
+    # the matches, taken from whichever column matched best, otherwise the start of the OCR text.
+    # Only call this with the rows of one page, never with a whole result set
+    ids = [DOCUMENT.id for DOCUMENT in documents]
+    if not ids:
+        return
+    placeholders = ", ".join(["%s"] * len(ids))
+    with connection.cursor() as cursor:
+        if expression:
+            cursor.execute(
+                f"SELECT rowid, snippet({TABLE}, -1, '{MATCH_START}', '{MATCH_END}', '…', {SNIPPET_TOKENS}) "
+                f"FROM {TABLE} WHERE {TABLE} MATCH %s AND rowid IN ({placeholders})", [expression, *ids])
+        else:
+            cursor.execute(
+                f"SELECT id, SUBSTR(ocr_metadata, 1, {PREVIEW_LENGTH}) "
+                f"FROM {documents[0]._meta.db_table} WHERE id IN ({placeholders})", ids)
+        snippets = dict(cursor.fetchall())
+    for DOCUMENT in documents:
+        DOCUMENT.search_snippet = snippets.get(DOCUMENT.id) or ""
+
+
+def snippet_html(DOCUMENT):
+    # The document's snippet with matches in <mark> tags and everything else escaped. Documents load_snippets was not
+    # called for have none, since reading their OCR text here would load all of it
+    snippet = getattr(DOCUMENT, "search_snippet", "")
+    return escape(snippet).replace(MATCH_START, "<mark>").replace(MATCH_END, "</mark>")
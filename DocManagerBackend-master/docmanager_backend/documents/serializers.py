@@ -1,5 +1,7 @@
 from rest_framework import serializers
 from .models import Document
+from .hashing import file_sha256
+from .search import snippet_html
 
 
 class DocumentUpdateSerializer(serializers.ModelSerializer):
@@ -37,8 +39,50 @@ class DocumentUploadSerializer(serializers.ModelSerializer):
             "document_year",
             "subject",
             "date_uploaded",
+            "ocr_status",
         ]
-        read_only_fields = ["id", "date_uploaded"]
+        read_only_fields = ["id", "date_uploaded", "ocr_status"]
+
+    def validate(self, attrs):
+        # Reject duplicates before the file is stored or sent for OCR
+        content_hash = file_sha256(attrs["file"])
+        DOCUMENT = Document.objects.filter(content_hash=content_hash).first()
+        if DOCUMENT:
+            raise serializers.ValidationError(
+                {"error": f"This file has already been uploaded as document {DOCUMENT.name} (ID:{DOCUMENT.id})"}
+            )
+        attrs["content_hash"] = content_hash
+        return attrs
+
+
+class DocumentOCRStatusSerializer(serializers.ModelSerializer):
+    # Polled by the frontend while an uploaded document is being read
+    ocr_progress = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Document
+        fields = [
+            "id",
+            "ocr_status",
+            "ocr_pages_done",
+            "number_pages",
+            "ocr_progress",
+        ]
+        read_only_fields = [
+            "id",
+            "ocr_status",
+            "ocr_pages_done",
+            "number_pages",
+            "ocr_progress",
+        ]
+
+    def get_ocr_progress(self, obj):
+        # Percentage of pages read
+        if obj.ocr_status == "done":
+            return 100
+        if not obj.number_pages:
+            return 0
+        return min(100, int(obj.ocr_pages_done * 100 / obj.number_pages))
 
 
 class DocumentDeleteSerializer(serializers.ModelSerializer):
@@ -48,10 +92,11 @@ class DocumentDeleteSerializer(serializers.ModelSerializer):
 
 
 class DocumentSerializer(serializers.ModelSerializer):
-    # Read-only serializer without link to the file
+    # Read-only serializer without link to the file. The OCR text is cut down to a snippet, see DocumentTextSerializer
     date_uploaded = serializers.DateTimeField(
         format="%m-%d-%Y %I:%M %p", read_only=True
     )
+    snippet = serializers.SerializerMethodField()
 
     class Meta:
         model = Document
@@ -60,7 +105,7 @@ class DocumentSerializer(serializers.ModelSerializer):
             "name",
             "document_type",
             "number_pages",
-            "ocr_metadata",
+            "snippet",
             "sent_from",
             "date_uploaded",
         ]
@@ -69,18 +114,24 @@ class DocumentSerializer(serializers.ModelSerializer):
             "name",
             "document_type",
             "number_pages",
-            "ocr_metadata",
+            "snippet",
             "sent_from",
             "date_uploaded",
         ]
+        # The snippet comes from the search_snippet annotation of the list views
+        field_sources = {"snippet": []}
+
+    def get_snippet(self, obj):
+        return snippet_html(obj)
 
 
 class DocumentFileSerializer(serializers.ModelSerializer):
-    # Read-only serializer which includes the actual link to the file
+    # Read-only serializer which includes the actual link to the file. The OCR text is cut down to a snippet
     date_uploaded = serializers.DateTimeField(
         format="%m-%d-%Y %I:%M %p", read_only=True
     )
     file = serializers.FileField()
+    snippet = serializers.SerializerMethodField()
 
     class Meta:
         model = Document
@@ -89,24 +140,65 @@ class DocumentFileSerializer(serializers.ModelSerializer):
             "name",
             "document_type",
             "number_pages",
-            "ocr_metadata",
+            "snippet",
             "date_uploaded",
             "sent_from",
             "document_month",
             "document_year",
             "subject",
             "file",
+            "ocr_status",
         ]
         read_only_fields = [
             "id",
             "name",
             "document_type",
             "number_pages",
-            "ocr_metadata",
+            "snippet",
             "date_uploaded",
             "sent_from",
             "document_month",
             "document_year",
             "subject",
             "file",
+            "ocr_status",
+        ]
+        field_sources = {"snippet": []}
+
+    def get_snippet(self, obj):
+        return snippet_html(obj)
+
+
+class DocumentSummarySerializer(DocumentSerializer):
+    # DocumentSerializer without the snippet, for unpaginated widget lists and documents nested in other responses,
+    # where building a snippet for every document would read the OCR text of all of them
+    class Meta(DocumentSerializer.Meta):
+        fields = [
+            field for field in DocumentSerializer.Meta.fields if field != "snippet"]
+        read_only_fields = fields
+
+
+class DocumentFileSummarySerializer(DocumentFileSerializer):
+    # DocumentFileSerializer without the snippet, see DocumentSummarySerializer
+    class Meta(DocumentFileSerializer.Meta):
+        fields = [
+            field for field in DocumentFileSerializer.Meta.fields if field != "snippet"]
+        read_only_fields = fields
+
+
+class DocumentTextSerializer(serializers.ModelSerializer):
+    # Full OCR text of a single document, left out of list responses
+    class Meta:
+        model = Document
+        fields = [
+            "id",
+            "ocr_metadata",
+            "text_sources",
+            "ocr_status",
+        ]
+        read_only_fields = [
+            "id",
+            "ocr_metadata",
+            "text_sources",
+            "ocr_status",
         ]
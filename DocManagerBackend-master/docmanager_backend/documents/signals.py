@@ -1,35 +1,47 @@
-from io import BytesIO
-from documents.models import Document
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.dispatch import receiver
-from config.settings import MEDIA_ROOT
-import os
-import fitz
-import pytesseract
-from PIL import Image
-from .models import Document
+from .models import Document, DocumentType
+from .tasks import queue_document_ocr
+from .metrics import metrics, log_event
+from .search import COLUMNS, index_documents, remove_documents
+import time
+
+
+@receiver(pre_save, sender=Document)
+def document_pre_save(sender, instance, **kwargs):
+    # Remember the stored type so post_save can tell if it changed
+    instance.previous_document_type = None
+    if instance.pk:
+        instance.previous_document_type = Document.objects.filter(
+            pk=instance.pk).values_list("document_type", flat=True).first()
 
 
 @receiver(post_save, sender=Document)
-def document_post_save(sender, instance, **kwargs):
-    if not instance.ocr_metadata:
-        metadata = ""
-        with fitz.open(os.path.join(MEDIA_ROOT, instance.file.name)) as doc:
-            mat = fitz.Matrix(1.2, 1.2)
-            for page in doc:
-                pix = page.get_pixmap(matrix=mat)
-                # Convert pixmap to bytes
-                img_bytes = pix.tobytes()
-
-                # Create a BytesIO object
-                img_buffer = BytesIO(img_bytes)
-
-                # Create a PIL Image object from the bytes
-                img = Image.open(img_buffer)
-
-                # Perform OCR
-                text = pytesseract.image_to_string(img).strip()
-                metadata += text
-
-        instance.ocr_metadata = metadata
-        instance.save()
+def document_post_save(sender, instance, created, update_fields=None, **kwargs):
+    start_time = time.perf_counter()
+
+    # OCR runs in the background so uploads return immediately
+    if created and instance.ocr_status == "pending":
+        queue_document_ocr(instance.id)
+
+    previous_document_type = getattr(
+        instance, "previous_document_type", None)
+    if created or previous_document_type is None:
+        DocumentType.adjust(instance.document_type, 1)
+    elif previous_document_type != instance.document_type:
+        DocumentType.adjust(previous_document_type, -1)
+        DocumentType.adjust(instance.document_type, 1)
+
+    # Saves that only touch unindexed columns, such as the file name, leave the search index alone
+    if update_fields is None or set(update_fields) & set(COLUMNS):
+        index_documents([instance])
+
+    metrics.inc("document_saves_total", created=str(created).lower())
+    log_event("document_saved", document_id=instance.id, created=created, document_type=instance.document_type,
+              ocr_status=instance.ocr_status, seconds=round(time.perf_counter() - start_time, 4))
+
+
+@receiver(post_delete, sender=Document)
+def document_post_delete(sender, instance, **kwargs):
+    DocumentType.adjust(instance.document_type, -1)
+    remove_documents([instance.id])
@@ -0,0 +1,58 @@
+import errno
+import os
+import shutil
+from django.conf import settings
+from django.core.files import File
+from .hashing import CHUNK_SIZE
+
+# Errors from os.link that mean hard links are not possible here, rather than a real problem with the file
+LINK_UNSUPPORTED = (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP)
+
+
+def store_file(field_file, source_path, filename, keep_source=False, save=True):
+    # Puts a file that is already on disk into a FileField's upload_to location and saves the instance (unless save is False).
+    # The file is hard linked (and the source removed unless keep_source is set) when both paths are on the same filesystem,
+    # so large scans are not copied. Otherwise it is copied in chunks
+    field = field_file.field
+    instance = field_file.instance
+    storage = field_file.storage
+
+    name = storage.get_available_name(field.generate_filename(
+        instance, filename), max_length=field.max_length)
+    try:
+        destination = storage.path(name)
+    except NotImplementedError:
+        # Storage without local paths, e.g. object storage
+        with open(source_path, "rb") as f:
+            field_file.save(name=filename, content=File(f), save=save)
+        if not keep_source:
+            os.remove(source_path)
+        return field_file.name
+
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    try:
+        # Unlike a rename, linking never replaces a file that was created at the destination in the meantime
+        os.link(source_path, destination)
+    except OSError as e:
+        if e.errno not in LINK_UNSUPPORTED:
+            raise
+        created = False
+        try:
+            with open(source_path, "rb") as source, open(destination, "xb") as target:
+                created = True
+                shutil.copyfileobj(source, target, CHUNK_SIZE)
+        except BaseException:
+            # Do not leave a partial copy behind. A file that was already at the destination is not ours to remove
+            if created:
+                os.remove(destination)
+            raise
+
+    if settings.FILE_UPLOAD_PERMISSIONS is not None:
+        os.chmod(destination, settings.FILE_UPLOAD_PERMISSIONS)
+    if not keep_source:
+        os.remove(source_path)
+
+    field_file.name = name
+    if save:
+        instance.save(update_fields=[field.attname])
+    return name
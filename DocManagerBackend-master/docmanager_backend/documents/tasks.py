@@ -0,0 +1,121 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import timedelta
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+from config.settings import (
+    MEDIA_ROOT,
+    OCR_BACKGROUND_WORKERS,
+    OCR_PROCESSES,
+    OCR_PAGES_PER_TASK,
+    OCR_PAGE_TIMEOUT,
+    OCR_STALE_SECONDS
+)
+import logging
+import multiprocessing
+import os
+import time
+from .models import Document
+from .ocr import read_document
+from .metrics import metrics, log_event
+from .search import COLUMNS, index_documents
+
+logger = logging.getLogger(__name__)
+
+# Runs OCR for uploaded documents outside of the request that uploaded them
+executor = ThreadPoolExecutor(
+    max_workers=OCR_BACKGROUND_WORKERS, thread_name_prefix="Document-OCR")
+
+# Pages are rendered and read in separate processes so large scans use every core.
+# Processes are only started once the first document is submitted
+ocr_executor = ProcessPoolExecutor(
+    max_workers=OCR_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+
+
+def queue_document_ocr(document_id):
+    # Wait for the upload to be committed so the background thread can see the row and its file
+    transaction.on_commit(
+        lambda: executor.submit(run_document_ocr, document_id))
+
+
+def requeue_document_ocr(pending_seconds=OCR_STALE_SECONDS, processing_seconds=OCR_STALE_SECONDS):
+    # Queued OCR only lives in the memory of the process that queued it, so documents are left pending or processing
+    # if that process stops. Queues documents uploaded more than pending_seconds ago that are still pending, and those
+    # processing for more than processing_seconds, in this process. Documents still queued elsewhere are only read once,
+    # since run_document_ocr claims them first. Returns the ids queued
+    start = now()
+    processing_before = start - timedelta(seconds=processing_seconds)
+    # Documents from before ocr_started was recorded go by their upload time
+    Document.objects.filter(Q(ocr_started__lt=processing_before) | Q(ocr_started__isnull=True, date_uploaded__lt=processing_before),
+                            ocr_status="processing").update(ocr_status="pending")
+
+    document_ids = list(Document.objects.filter(ocr_status="pending", date_uploaded__lt=start - timedelta(
+        seconds=pending_seconds)).order_by("id").values_list("id", flat=True))
+    for document_id in document_ids:
+        executor.submit(run_document_ocr, document_id)
+    if document_ids:
+        log_event("document_ocr_requeued", count=len(document_ids))
+    return document_ids
+
+
+def reset_document_ocr(document_ids=None):
+    # Sets failed documents, or the given ones unless they are being read, back to pending so they can be read again.
+    # Returns their ids
+    documents = Document.objects.exclude(ocr_status="processing")
+    if document_ids is None:
+        documents = documents.filter(ocr_status="failed")
+    else:
+        documents = documents.filter(id__in=document_ids)
+    document_ids = list(documents.order_by("id").values_list("id", flat=True))
+    Document.objects.filter(id__in=document_ids).update(ocr_status="pending")
+    return document_ids
+
+
+def run_document_ocr(document_id):
+    start_time = time.perf_counter()
+    try:
+        # Only one thread should process a document. Updates are used throughout so post_save is not fired again
+        claimed = Document.objects.filter(id=document_id, ocr_status="pending").update(
+            ocr_status="processing", ocr_pages_done=0, ocr_started=now())
+        if not claimed:
+            return None
+
+        DOCUMENT = Document.objects.get(id=document_id)
+
+        def on_progress(pages_done):
+            # Report progress so the frontend can poll it
+            Document.objects.filter(id=document_id).update(
+                ocr_pages_done=pages_done)
+
+        texts, text_sources = read_document(
+            os.path.join(MEDIA_ROOT, DOCUMENT.file.name),
+            executor=ocr_executor,
+            parallelism=OCR_PROCESSES,
+            pages_per_task=OCR_PAGES_PER_TASK,
+            page_timeout=OCR_PAGE_TIMEOUT,
+            on_progress=on_progress,
+        )
+        metadata = "\n".join(texts)
+
+        Document.objects.filter(id=document_id).update(
+            ocr_metadata=metadata,
+            text_sources=text_sources,
+            ocr_status="done",
+        )
+        # update() skips signals, so the new text is indexed here
+        index_documents(
+            Document.objects.filter(id=document_id).only(*COLUMNS))
+
+        elapsed = time.perf_counter() - start_time
+        metrics.inc("document_ocr_total", outcome="done")
+        metrics.observe("document_ocr_seconds", elapsed)
+        log_event("document_ocr", document_id=document_id, outcome="done", pages=len(texts),
+                  ocr_pages=text_sources.count("ocr"), failed_pages=text_sources.count("failed"), seconds=round(elapsed, 4))
+    except Exception as e:
+        logger.error(f"OCR failed for document ID:{document_id}: {str(e)}")
+        Document.objects.filter(id=document_id).update(ocr_status="failed")
+        metrics.inc("document_ocr_total", outcome="failed")
+        log_event("document_ocr", document_id=document_id, outcome="failed",
+                  error=str(e), seconds=round(time.perf_counter() - start_time, 4))
+    finally:
+        close_old_connections()
@@ -5,6 +5,12 @@ from .views import (
     DocumentListView,
     DocumentStaffListView,
     DocumentUpdateView,
+    DocumentOCRStatusView,
+    DocumentTextView,
+    DocumentOCRCacheStatsView,
+    DocumentExtractionStatsView,
+    DocumentTypeListView,
+    DocumentMetricsView,
     WidgetDocumentListView,
     WidgetDocumentStaffListView
 )
@@ -13,6 +19,12 @@ urlpatterns = [
     path("upload/", DocumentUploadView.as_view()),
     path("update/<int:pk>/", DocumentUpdateView.as_view()),
     path("delete/<int:pk>/", DocumentDeleteView.as_view()),
+    path("ocr_status/<int:pk>/", DocumentOCRStatusView.as_view()),
+    path("text/<int:pk>/", DocumentTextView.as_view()),
+    path("ocr_cache/", DocumentOCRCacheStatsView.as_view()),
+    path("extraction_stats/", DocumentExtractionStatsView.as_view()),
+    path("types/", DocumentTypeListView.as_view()),
+    path("metrics/", DocumentMetricsView.as_view()),
     path("list/", DocumentListView.as_view()),
     path("list/staff/", DocumentStaffListView.as_view()),
     path("widget/", WidgetDocumentListView.as_view()),
@@ -2,17 +2,26 @@ from rest_framework import generics
 from .serializers import (
     DocumentSerializer,
     DocumentFileSerializer,
+    DocumentSummarySerializer,
+    DocumentFileSummarySerializer,
     DocumentUploadSerializer,
     DocumentDeleteSerializer,
-    DocumentUpdateSerializer
+    DocumentUpdateSerializer,
+    DocumentOCRStatusSerializer,
+    DocumentTextSerializer
 )
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.views import APIView
+from rest_framework.response import Response
 from accounts.permissions import IsStaff, IsHead
-from .models import Document
+from api.mixins import SparseFieldsMixin
+from .models import Document, DocumentType, ExtractionRun
+from .ocr import get_ocr_cache
+from .metrics import collect, web_process
+from .search import match_expression, search, load_snippets
+from django.http import HttpResponse
 from django.db.models import Q
-from operator import or_
-from functools import reduce
 
 
 class DocumentPagination(PageNumberPagination):
@@ -42,6 +51,79 @@ class DocumentUploadView(generics.CreateAPIView):
     permission_classes = [IsAuthenticated, IsStaff]
 
 
+class DocumentOCRStatusView(generics.RetrieveAPIView):
+    """
+    Used by staff to poll the OCR status and progress of an uploaded document. Accepts the document id as a URL parameter
+    """
+
+    http_method_names = ["get"]
+    serializer_class = DocumentOCRStatusSerializer
+    queryset = Document.objects.all()
+    permission_classes = [IsAuthenticated, IsStaff]
+
+
+class DocumentTextView(generics.RetrieveAPIView):
+    """
+    Used to view the full OCR text of a document, which list views leave out. Accepts the document id as a URL parameter
+    """
+
+    http_method_names = ["get"]
+    serializer_class = DocumentTextSerializer
+    queryset = Document.objects.all()
+    permission_classes = [IsAuthenticated]
+
+
+class DocumentOCRCacheStatsView(APIView):
+    """
+    Used by staff to view OCR cache hit and miss counts
+    """
+
+    http_method_names = ["get"]
+    permission_classes = [IsAuthenticated, IsStaff]
+
+    def get(self, request):
+        ocr_cache = get_ocr_cache()
+        if not ocr_cache:
+            return Response({"enabled": False})
+        return Response({"enabled": True, **ocr_cache.stats()})
+
+
+class DocumentExtractionStatsView(APIView):
+    """
+    Used by staff to compare the latency and agreement of the vision and text extraction modes
+    """
+
+    http_method_names = ["get"]
+    permission_classes = [IsAuthenticated, IsStaff]
+
+    def get(self, request):
+        return Response(ExtractionRun.summary())
+
+
+class DocumentTypeListView(APIView):
+    """
+    Used by staff to list the distinct document types and how many documents use each
+    """
+
+    http_method_names = ["get"]
+    permission_classes = [IsAuthenticated, IsStaff]
+
+    def get(self, request):
+        return Response(DocumentType.cached())
+
+
+class DocumentMetricsView(APIView):
+    """
+    Used by staff to view ingestion and OCR metrics in the Prometheus text format
+    """
+
+    http_method_names = ["get"]
+    permission_classes = [IsAuthenticated, IsStaff]
+
+    def get(self, request):
+        return HttpResponse(collect(web_process()).render(), content_type="text/plain; version=0.0.4")
+
+
 class DocumentDeleteView(generics.DestroyAPIView):
     """
     Used by staff to delete documents. Accepts the document id as a URL parameter
@@ -53,37 +135,51 @@ class DocumentDeleteView(generics.DestroyAPIView):
     permission_classes = [IsAuthenticated, IsStaff]
 
 
-class DocumentListView(generics.ListAPIView):
+class DocumentSnippetMixin(SparseFieldsMixin):
+    # Loads text snippets once the rows to return are known, so they are only built for one page,
+    # and not at all when ?fields= leaves the snippet out
+    search_expression = None
+
+    def get_serializer(self, *args, **kwargs):
+        if kwargs.get("many") and args and self.wants_field("snippet"):
+            documents = list(args[0])
+            load_snippets(documents, self.search_expression)
+            args = (documents, *args[1:])
+        return super().get_serializer(*args, **kwargs)
+
+
+class DocumentListView(DocumentSnippetMixin, generics.ListAPIView):
     """
     Used by clients to view documents. Does not include actual download links to documents
     """
 
     http_method_names = ["get"]
     serializer_class = DocumentSerializer
-    queryset = Document.objects.all().order_by("-date_uploaded")
+    queryset = Document.objects.defer("ocr_metadata").order_by("-date_uploaded")
     pagination_class = DocumentPagination
     permission_classes = [IsAuthenticated]
 
-class WidgetDocumentListView(generics.ListAPIView):
+class WidgetDocumentListView(SparseFieldsMixin, generics.ListAPIView):
     """
-    Used by a widget for clients to view documents. Does not include actual download links to documents
+    Used by a widget for clients to view documents. Does not include actual download links to documents.
+    Returns every document, so snippets are left out
     """
 
     http_method_names = ["get"]
-    serializer_class = DocumentSerializer
-    queryset = Document.objects.all().order_by("-date_uploaded")
+    serializer_class = DocumentSummarySerializer
+    queryset = Document.objects.defer("ocr_metadata").order_by("-date_uploaded")
     pagination_class = PageNumberPagination
     permission_classes = [IsAuthenticated]
 
 
-class DocumentStaffListView(generics.ListAPIView):
+class DocumentStaffListView(DocumentSnippetMixin, generics.ListAPIView):
     """
     Used by staff to view documents. Includes actual download links to documents
     """
 
     http_method_names = ["get"]
     serializer_class = DocumentFileSerializer
-    queryset = Document.objects.all().order_by("-date_uploaded")
+    queryset = Document.objects.defer("ocr_metadata").order_by("-date_uploaded")
     pagination_class = DocumentPagination
     permission_classes = [IsAuthenticated, IsStaff]
 
@@ -91,39 +187,13 @@ class DocumentStaffListView(generics.ListAPIView):
         # Get the base queryset
         queryset = super().get_queryset()
 
-        # Check if 'keywords' query parameter is present
+        # Search the full-text index instead of scanning every column with LIKE
         keyword = self.request.query_params.get('search', None)
 
         if keyword:
-            queries = []
-            # Create a list to hold individual field conditions for this keyword
-            field_queries = [
-                Q(name__icontains=keyword),
-                Q(document_type__icontains=keyword),
-                Q(sent_from__icontains=keyword),
-                Q(document_month__icontains=keyword),
-                Q(document_year__icontains=keyword),
-                Q(subject__icontains=keyword),
-                Q(ocr_metadata__icontains=keyword)
-            ]
-            # Combine the field conditions with OR
-            combined_query = Q()
-            for q in field_queries:
-                if not combined_query:
-                    combined_query = q
-                else:
-                    combined_query |= q
-            queries.append(combined_query)
-
-            # Now combine all keyword conditions with OR
-            final_query = Q()
-            for q in queries:
-                if not final_query:
-                    final_query = q
-                else:
-                    final_query |= q
-
-            queryset = queryset.filter(final_query)
+            self.search_expression = match_expression(keyword)
+        if self.search_expression:
+            queryset = search(queryset, self.search_expression)
 
         # Add filters for document_month and document_year if provided
         document_month = self.request.query_params.get('document_month', None)
@@ -156,6 +226,9 @@ class DocumentStaffListView(generics.ListAPIView):
             if direction == "desc":
                 sort = f"-{sort}"
             queryset = queryset.order_by(sort)
+        elif self.search_expression:
+            # Best matches first
+            queryset = queryset.order_by("search_rank", "-date_uploaded")
         else:
             # Default sorting to "date_uploaded" descending
             queryset = queryset.order_by("-date_uploaded")
@@ -166,14 +239,15 @@ class DocumentStaffListView(generics.ListAPIView):
         # Retrieve distinct years from the Document model
         return Document.objects.values('document_year').distinct()
 
-class WidgetDocumentStaffListView(generics.ListAPIView):
+class WidgetDocumentStaffListView(SparseFieldsMixin, generics.ListAPIView):
     """
-    Used by a widget for staff to view documents. Includes actual download links to documents
+    Used by a widget for staff to view documents. Includes actual download links to documents.
+    Returns every matching document, so snippets are left out
     """
 
     http_method_names = ["get"]
-    serializer_class = DocumentFileSerializer
-    queryset = Document.objects.all().order_by("-date_uploaded")
+    serializer_class = DocumentFileSummarySerializer
+    queryset = Document.objects.defer("ocr_metadata").order_by("-date_uploaded")
     pagination_class = PageNumberPagination
     permission_classes = [IsAuthenticated, IsStaff]
 
@@ -181,38 +255,12 @@ class WidgetDocumentStaffListView(generics.ListAPIView):
         # Get the base queryset
         queryset = super().get_queryset()
 
-        # Check if 'keywords' query parameter is present
+        # Search the full-text index instead of scanning every column with LIKE
         keyword = self.request.query_params.get('search', None)
 
-        if keyword:
-            queries = []
-            # Create a list to hold individual field conditions for this keyword
-            field_queries = [
-                Q(name__icontains=keyword),
-                Q(document_type__icontains=keyword),
-                Q(sent_from__icontains=keyword),
-                Q(document_month__icontains=keyword),
-                Q(document_year__icontains=keyword),
-                Q(subject__icontains=keyword),
-                Q(ocr_metadata__icontains=keyword)
-            ]
-            # Combine the field conditions with OR
-            combined_query = Q()
-            for q in field_queries:
-                if not combined_query:
-                    combined_query = q
-                else:
-                    combined_query |= q
-            queries.append(combined_query)
-
-            # Now combine all keyword conditions with OR
-            final_query = Q()
-            for q in queries:
-                if not final_query:
-                    final_query = q
-                else:
-                    final_query |= q
-
-            queryset = queryset.filter(final_query)
+        search_expression = match_expression(keyword) if keyword else None
+        if search_expression:
+            queryset = search(queryset, search_expression).order_by(
+                "search_rank", "-date_uploaded")
 
         return queryset
@@ -50,11 +50,6 @@ class QuestionnaireSerializer(serializers.ModelSerializer):
     def get_sex(self, obj):
         return obj.client.sex
 
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation["client"] = instance.client.email
-        return super().to_representation(instance)
-
     def create(self, validated_data):
         user = self.context["request"].user
         # Set questionnaire user to the one who sent the HTTP request to prevent spoofing
@@ -121,3 +116,5 @@ class QuestionnaireSerializer(serializers.ModelSerializer):
             "extra_suggestions",
         ]
         read_only_fields = ["id", "date_submitted"]
+        # Model fields read by get_age and get_sex, for SparseFieldsMixin
+        field_sources = {"age": ["client"], "sex": ["client"]}
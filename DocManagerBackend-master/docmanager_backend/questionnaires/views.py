@@ -4,13 +4,14 @@ from rest_framework.permissions import IsAuthenticated
 from .models import Questionnaire
 from rest_framework.pagination import PageNumberPagination
 from accounts.permissions import IsStaff, IsPlanning
+from api.mixins import SparseFieldsMixin
 
 class QuestionnairePagination(PageNumberPagination):
     page_size = 4
     page_size_query_param = 'page_size'
     max_page_size = 4
 
-class QuestionnaireListAPIView(generics.ListAPIView):
+class QuestionnaireListAPIView(SparseFieldsMixin, generics.ListAPIView):
     """
     Used by staff to view questionnaires
     """
@@ -53,7 +54,7 @@ class QuestionnaireListAPIView(generics.ListAPIView):
 
         return queryset
 
-class WidgetQuestionnaireListAPIView(generics.ListAPIView):
+class WidgetQuestionnaireListAPIView(SparseFieldsMixin, generics.ListAPIView):
     """
     Used by staff to view questionnaires
     """
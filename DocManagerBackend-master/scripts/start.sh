@@ -12,5 +12,5 @@ fi
 if [ "$DEBUG" = 'True' ]; then
     python manage.py runserver "0.0.0.0:8000"
 else
-    gunicorn --workers 8 --bind 0.0.0.0:8000 config.wsgi:application
+    gunicorn --workers "${WEB_WORKERS:-8}" --bind 0.0.0.0:8000 config.wsgi:application
 fi
@@ -307,13 +307,22 @@ export type DocumentType = {
   sent_from: string;
   number_pages: number;
   file?: string;
-  ocr_metadata: string;
+  // Part of the OCR text, with search matches in <mark> tags. The full text comes from DocumentTextAPI.
+  // Only document lists include it, documents nested in requests do not
+  snippet?: string;
   date_uploaded: string;
   document_month: string;
   document_year: string;
   subject: string;
 };
 
+export type DocumentTextType = {
+  id: number;
+  ocr_metadata: string;
+  text_sources: string[];
+  ocr_status: string;
+};
+
 export type DocumentCreateType = {
   name: string;
   file: File | null;
@@ -365,10 +374,14 @@ export async function DocumentsAPI(
   }
 }
 
-export async function WidgetDocumentsAPI() {
+// fields limits the response to a comma-separated list of fields, e.g. "id,document_type"
+export async function WidgetDocumentsAPI(fields?: string) {
   const config = await GetConfig();
   return instance
-    .get("api/v1/documents/widget/", config)
+    .get(
+      fields ? `api/v1/documents/widget/?fields=${fields}` : "api/v1/documents/widget/",
+      config
+    )
     .then((response) => {
       return response.data as DocumentType[];
     })
@@ -417,6 +430,15 @@ export async function WidgetStaffDocumentsAPI() {
     });
 }
 
+export async function DocumentTextAPI(id: number) {
+  const config = await GetConfig();
+  return instance
+    .get(`api/v1/documents/text/${id}/`, config)
+    .then((response) => {
+      return response.data as DocumentTextType;
+    });
+}
+
 export async function DocumentCreateAPI(document: FormData) {
   const config = await GetConfig();
   return instance
@@ -803,10 +825,13 @@ export async function QuestionnairesAPI(
   }
 }
 
-export async function WidgetQuestionnairesAPI() {
+export async function WidgetQuestionnairesAPI(fields?: string) {
   const config = await GetConfig();
   return instance
-    .get("api/v1/questionnaires/widget/", config)
+    .get(
+      fields ? `api/v1/questionnaires/widget/?fields=${fields}` : "api/v1/questionnaires/widget/",
+      config
+    )
     .then((response) => {
       return response.data as QuestionnaireType[];
     })
@@ -68,8 +68,8 @@ export default function ClientDocumentsPage() {
                   .toLowerCase()
                   .includes(search_term.toLowerCase()) ||
                 search_term.includes(String(document.number_pages)) ||
-                document.ocr_metadata
-                  .toLowerCase()
+                document.snippet
+                  ?.toLowerCase()
                   .includes(search_term.toLowerCase()) ||
                 document.date_uploaded
                   .toLowerCase()
@@ -105,8 +105,8 @@ export default function ClientDocumentsPage() {
                         .toLowerCase()
                         .includes(search_term.toLowerCase()) ||
                       search_term.includes(String(document.number_pages)) ||
-                      document.ocr_metadata
-                        .toLowerCase()
+                      document.snippet
+                        ?.toLowerCase()
                         .includes(search_term.toLowerCase()) ||
                       document.date_uploaded
                         .toLowerCase()
@@ -37,7 +37,7 @@ export default function CreateDocumentRequestPage() {
   const [error, setError] = useState("");
   const documents = useQuery({
     queryKey: ["client_documents"],
-    queryFn: WidgetDocumentsAPI,
+    queryFn: () => WidgetDocumentsAPI(),
   });
   const [document_request, setDocumentRequest] =
     useState<DocumentRequestCreateType>({
@@ -39,13 +39,15 @@ export default function DashboardPage() {
     queryFn: WidgetAuthorizationRequestsAPI,
   });
   const user = useQuery({ queryKey: ["user"], queryFn: UserAPI });
+  // Only the fields the dashboard shows are requested. The field set is part of the key so these are cached apart from
+  // the full lists, while invalidating "questionnaires" or "client_documents" still refreshes them
   const questionnaires = useQuery({
-    queryKey: ["questionnaires"],
-    queryFn: WidgetQuestionnairesAPI,
+    queryKey: ["questionnaires", { fields: "id" }],
+    queryFn: () => WidgetQuestionnairesAPI("id"),
   });
   const documents = useQuery({
-    queryKey: ["client_documents"],
-    queryFn: WidgetDocumentsAPI,
+    queryKey: ["client_documents", { fields: "id,document_type,date_uploaded" }],
+    queryFn: () => WidgetDocumentsAPI("id,document_type,date_uploaded"),
   });
   const totalUsers = useQuery({
     queryKey: ["total_users"],